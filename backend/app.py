@@ -1,36 +1,79 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, url_for, g
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 import os
-from datetime import datetime, timedelta
+from datetime import timedelta
 import jwt
+from sqlalchemy.exc import IntegrityError
+from auth import (Principal, init_auth, issue_tokens, load_principal, revocation_list, revoke_tokens, token_issuer,
+                  token_required)
+from bulk import export_users_command, import_users_command
+from database import init_database
 from extensions import db
+from fulltext import sync_sitter
+from geo import locate_user
+from metrics import init_metrics
 from models import User, Family, Sitter, Availability
+from migrations import init_db
+from passwords import PasswordHasherBusy, init_passwords, password_hasher
+from ratelimit import init_rate_limiter, rate_limit
+from schedule import MAX_SCHEDULE_SLOTS, MINUTES_PER_DAY, InvalidSchedule, merge_slots, slot_intervals
+from scoring import compute_score, refresh_score
+from search_cache import init_search_cache, invalidate_sitter, search_cache, sitter_buckets
+from search import (InvalidSearch, default_fields, parse_day_window, parse_fields, parse_limit, parse_near,
+                    parse_query, parse_sort, parse_window, search_sitters, sitter_serializer)
+from serializers import (FAMILY_PROFILE, SITTER_PROFILE, USER_PROFILE, JSONProvider, dumps,
+                         serialize_availabilities, serialize_availability)
 
 app = Flask(__name__)
-CORS(app, supports_credentials=True)
+app.json = JSONProvider(app)
+CORS(app, supports_credentials=True, expose_headers=['X-Next-Cursor', 'Link', 'ETag'])
 
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_secret_key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///trustsitter.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', '')
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt_secret_key')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', 15)))
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.environ.get('JWT_REFRESH_TOKEN_DAYS', 14)))
+app.config['TOKEN_REVOCATION_REFRESH'] = int(os.environ.get('TOKEN_REVOCATION_REFRESH', 10))
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+app.config['SEARCH_CACHE_URL'] = os.environ.get('SEARCH_CACHE_URL', 'memory://')
+app.config['SEARCH_CACHE_SIZE'] = int(os.environ.get('SEARCH_CACHE_SIZE', 1024))
+app.config['SEARCH_CACHE_TTL'] = int(os.environ.get('SEARCH_CACHE_TTL', 60))
+app.config['SEARCH_FLIGHT_TIMEOUT'] = int(os.environ.get('SEARCH_FLIGHT_TIMEOUT', 5))
+app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+app.config['RATE_LIMIT_URL'] = os.environ.get('RATE_LIMIT_URL', 'memory://')
+app.config['RATE_LIMIT_LOGIN_IP'] = os.environ.get('RATE_LIMIT_LOGIN_IP', '20/minute')
+app.config['RATE_LIMIT_LOGIN_ACCOUNT'] = os.environ.get('RATE_LIMIT_LOGIN_ACCOUNT', '5/minute')
+app.config['RATE_LIMIT_SEARCH_IP'] = os.environ.get('RATE_LIMIT_SEARCH_IP', '120/minute')
+app.config['RATE_LIMIT_SEARCH_ACCOUNT'] = os.environ.get('RATE_LIMIT_SEARCH_ACCOUNT', '60/minute')
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+app.config['QUERY_COUNT_WARNING'] = int(os.environ.get('QUERY_COUNT_WARNING', 20))
 
 # Initialize extensions
-db.init_app(app)
+init_database(app)
+init_passwords(app)
+init_auth(app)
+init_search_cache(app)
+init_rate_limiter(app)
+init_metrics(app)
 
 @app.route('/api/register', methods=['POST'])
 def register():
     data = request.get_json()
     
-    # Check if user already exists
-    existing_user = User.query.filter_by(email=data['email']).first()
-    if existing_user:
-        return jsonify({'message': 'Email already registered'}), 409
-    
     # Create new user
-    hashed_password = generate_password_hash(data['password'], method='sha256')
+    try:
+        hashed_password = password_hasher().hash(data['password'])
+    except PasswordHasherBusy:
+        return jsonify({'message': 'Server is busy, please try again'}), 503, {'Retry-After': '1'}
     
     new_user = User(
         first_name=data['firstName'],
@@ -43,41 +86,66 @@ def register():
         city=data.get('city', ''),
         zip_code=data.get('zipCode', '')
     )
+    locate_user(new_user)
     
     db.session.add(new_user)
-    db.session.commit()
     
-    # Create specific user type record
+    # Create specific user type record. It hangs off new_user through the
+    # relationship, so the whole signup is flushed and committed once
+    new_family = new_sitter = None
     if data['accountType'] == 'family':
         new_family = Family(
-            user_id=new_user.id,
+            user=new_user,
             children_count=data.get('childrenCount', ''),
             sitting_needs=data.get('sittingNeeds', '')
         )
         db.session.add(new_family)
     else:  # sitter
         new_sitter = Sitter(
-            user_id=new_user.id,
+            user=new_user,
             experience=data.get('experience', ''),
             is_verified=False,  # Default to unverified
-            services=','.join(data.get('services', [])),
-            hourly_rate=data.get('hourlyRate', 0),
+            hourly_rate=data.get('hourlyRate') or 0,
             bio=data.get('bio', ''),
             is_profile_public=False  # Default to private profile
         )
+        # The tag lookups would otherwise autoflush the pending user early
+        with db.session.no_autoflush:
+            new_sitter.set_tags('service', data.get('services', []))
+            new_sitter.set_tags('age_group', data.get('ageGroups', []))
+            new_sitter.set_tags('certification', data.get('certifications', []))
+        # No slots yet, so no need to ask the database for availability
+        new_sitter.search_score = compute_score(
+            bio=new_sitter.bio,
+            experience=new_sitter.experience,
+            services=new_sitter.services,
+            age_groups=new_sitter.age_groups,
+            certifications=new_sitter.certifications
+        )
         db.session.add(new_sitter)
     
-    db.session.commit()
-    
-    # Generate token
-    token = jwt.encode({
-        'user_id': new_user.id,
-        'exp': datetime.utcnow() + app.config['JWT_ACCESS_TOKEN_EXPIRES']
-    }, app.config['JWT_SECRET_KEY'])
+    # The unique constraint on user.email catches duplicates, instead of a
+    # SELECT on every signup
+    try:
+        db.session.flush()
+        # The flush assigned the ids, so the token claims need no query
+        principal = Principal(
+            user_id=new_user.id,
+            user_type=new_user.user_type,
+            sitter_id=new_sitter.id if new_sitter else None,
+            family_id=new_family.id if new_family else None,
+            token_version=0
+        )
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        if User.query.filter_by(email=data['email']).first() is None:
+            raise
+        return jsonify({'message': 'Email already registered'}), 409
     
     return jsonify({
         'message': 'User registered successfully',
-        'token': token,
+        **issue_tokens(principal),
         'user': {
             'id': new_user.id,
             'firstName': new_user.first_name,
@@ -88,30 +156,46 @@ def register():
         }
     }), 201
 
+def login_account():
+    email = (request.get_json(silent=True) or {}).get('email')
+    return email.strip().lower() if isinstance(email, str) else None
+
 @app.route('/api/login', methods=['POST'])
+@rate_limit('login', account=login_account)
 def login():
     data = request.get_json()
     
-    user = User.query.filter_by(email=data['email']).first()
+    # The sitter / family ids and verification status come along for the
+    # token claims
+    user, sitter_id, family_id, sitter_verified = (
+        db.session.query(User, Sitter.id, Family.id, Sitter.is_verified)
+        .outerjoin(Sitter, Sitter.user_id == User.id)
+        .outerjoin(Family, Family.user_id == User.id)
+        .filter(User.email == data['email'])
+        .first()
+    ) or (None, None, None, None)
     
-    if not user or not check_password_hash(user.password, data['password']):
-        return jsonify({'message': 'Invalid credentials'}), 401
+    hasher = password_hasher()
+    try:
+        if not user or not hasher.verify(user.password, data['password']):
+            return jsonify({'message': 'Invalid credentials'}), 401
+        
+        # Upgrade hashes made with an older scheme or cost while we still
+        # have the plaintext
+        if hasher.needs_rehash(user.password):
+            user.password = hasher.hash(data['password'])
+            db.session.commit()
+    except PasswordHasherBusy:
+        return jsonify({'message': 'Server is busy, please try again'}), 503, {'Retry-After': '1'}
     
-    # Check if user is a sitter and get verification status
     is_verified = None
     if user.user_type == 'sitter':
-        sitter = Sitter.query.filter_by(user_id=user.id).first()
-        is_verified = sitter.is_verified if sitter else False
-    
-    # Generate token
-    token = jwt.encode({
-        'user_id': user.id,
-        'exp': datetime.utcnow() + app.config['JWT_ACCESS_TOKEN_EXPIRES']
-    }, app.config['JWT_SECRET_KEY'])
+        is_verified = bool(sitter_verified)
+    principal = Principal(user.id, user.user_type, sitter_id, family_id, user.token_version)
     
     return jsonify({
         'message': 'Login successful',
-        'token': token,
+        **issue_tokens(principal),
         'user': {
             'id': user.id,
             'firstName': user.first_name,
@@ -122,348 +206,374 @@ def login():
         }
     }), 200
 
-@app.route('/api/profile', methods=['GET'])
-def get_profile():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'message': 'Token is missing'}), 401
+@app.route('/api/token/refresh', methods=['POST'])
+def refresh_token():
+    data = request.get_json(silent=True) or {}
     
     try:
-        token = token.split(' ')[1]  # Remove 'Bearer ' prefix
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        user_id = data['user_id']
-        
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'message': 'User not found'}), 404
-        
-        profile_data = {
-            'id': user.id,
-            'firstName': user.first_name,
-            'lastName': user.last_name,
-            'email': user.email,
-            'phone': user.phone,
-            'address': user.address,
-            'city': user.city,
-            'zipCode': user.zip_code,
-            'userType': user.user_type,
-        }
-        
-        # Add user type specific data
-        if user.user_type == 'family':
-            family = Family.query.filter_by(user_id=user.id).first()
-            if family:
-                profile_data.update({
-                    'childrenCount': family.children_count,
-                    'sittingNeeds': family.sitting_needs
-                })
-        else:  # sitter
-            sitter = Sitter.query.filter_by(user_id=user.id).first()
-            if sitter:
-                profile_data.update({
-                    'experience': sitter.experience,
-                    'isVerified': sitter.is_verified,
-                    'services': sitter.services.split(',') if sitter.services else [],
-                    'hourlyRate': sitter.hourly_rate,
-                    'bio': sitter.bio,
-                    'isProfilePublic': sitter.is_profile_public,
-                    'verificationRequested': sitter.verification_requested
-                })
-                
-                # Get availability
-                availabilities = Availability.query.filter_by(sitter_id=sitter.id).all()
-                profile_data['availability'] = [
-                    {
-                        'id': a.id,
-                        'day': a.day,
-                        'startTime': a.start_time,
-                        'endTime': a.end_time
-                    } for a in availabilities
-                ]
-        
-        return jsonify(profile_data), 200
-    
+        claims = token_issuer().decode(data.get('refreshToken') or '', 'refresh')
     except jwt.ExpiredSignatureError:
-        return jsonify({'message': 'Token has expired'}), 401
+        return jsonify({'message': 'Refresh token has expired'}), 401
     except jwt.InvalidTokenError:
         return jsonify({'message': 'Invalid token'}), 401
+    
+    # Refreshing is rare enough to check the database rather than the
+    # revocation list, and it picks up a changed verification status
+    principal = load_principal(claims['user_id'])
+    if principal is None or principal.token_version != claims['tv']:
+        return jsonify({'message': 'Token has been revoked'}), 401
+    
+    return jsonify(issue_tokens(principal)), 200
+
+@app.route('/api/logout', methods=['POST'])
+@token_required()
+def logout():
+    # Revokes every access and refresh token issued to the user so far,
+    # on every device
+    user = db.session.get(User, g.principal.user_id)
+    user_id, token_version = user.id, revoke_tokens(user)
+    db.session.commit()
+    revocation_list().revoke(user_id, token_version)
+    
+    return jsonify({'message': 'Logged out'}), 200
+
+@app.route('/api/profile', methods=['GET'])
+@token_required()
+def get_profile():
+    principal = g.principal
+    user = db.session.get(User, principal.user_id)
+    
+    profile_data = USER_PROFILE(user)
+    
+    # Add user type specific data
+    if user.user_type == 'family':
+        family = db.session.get(Family, principal.family_id) if principal.family_id else None
+        if family:
+            profile_data.update(FAMILY_PROFILE(family))
+    else:  # sitter
+        sitter = db.session.get(Sitter, principal.sitter_id) if principal.sitter_id else None
+        if sitter:
+            profile_data.update(SITTER_PROFILE(sitter))
+            
+            # Get availability
+            availabilities = Availability.query.filter_by(sitter_id=sitter.id).all()
+            profile_data['availability'] = serialize_availabilities(availabilities)
+    
+    return jsonify(profile_data), 200
 
 @app.route('/api/profile', methods=['PUT'])
+@token_required()
 def update_profile():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'message': 'Token is missing'}), 401
+    principal = g.principal
+    user = db.session.get(User, principal.user_id)
+    sitter = db.session.get(Sitter, principal.sitter_id) if principal.sitter_id else None
+    before = sitter_buckets(sitter) if sitter else None
     
-    try:
-        token = token.split(' ')[1]  # Remove 'Bearer ' prefix
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        user_id = data['user_id']
-        
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'message': 'User not found'}), 404
-        
-        update_data = request.get_json()
-        
-        # Update user data
-        user.first_name = update_data.get('firstName', user.first_name)
-        user.last_name = update_data.get('lastName', user.last_name)
-        user.phone = update_data.get('phone', user.phone)
-        user.address = update_data.get('address', user.address)
-        user.city = update_data.get('city', user.city)
-        user.zip_code = update_data.get('zipCode', user.zip_code)
-        
-        # Update user type specific data
-        if user.user_type == 'family':
-            family = Family.query.filter_by(user_id=user.id).first()
-            if family:
-                family.children_count = update_data.get('childrenCount', family.children_count)
-                family.sitting_needs = update_data.get('sittingNeeds', family.sitting_needs)
-        else:  # sitter
-            sitter = Sitter.query.filter_by(user_id=user.id).first()
-            if sitter:
-                sitter.experience = update_data.get('experience', sitter.experience)
-                if 'services' in update_data:
-                    sitter.services = ','.join(update_data['services'])
-                sitter.hourly_rate = update_data.get('hourlyRate', sitter.hourly_rate)
-                sitter.bio = update_data.get('bio', sitter.bio)
-                sitter.is_profile_public = update_data.get('isProfilePublic', sitter.is_profile_public)
-        
-        db.session.commit()
-        
-        return jsonify({'message': 'Profile updated successfully'}), 200
+    update_data = request.get_json()
     
-    except jwt.ExpiredSignatureError:
-        return jsonify({'message': 'Token has expired'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'message': 'Invalid token'}), 401
+    # Update user data
+    user.first_name = update_data.get('firstName', user.first_name)
+    user.last_name = update_data.get('lastName', user.last_name)
+    user.phone = update_data.get('phone', user.phone)
+    user.address = update_data.get('address', user.address)
+    user.city = update_data.get('city', user.city)
+    user.zip_code = update_data.get('zipCode', user.zip_code)
+    if {'address', 'city', 'zipCode'} & update_data.keys():
+        locate_user(user)
+    
+    # Update user type specific data
+    if user.user_type == 'family':
+        family = db.session.get(Family, principal.family_id) if principal.family_id else None
+        if family:
+            family.children_count = update_data.get('childrenCount', family.children_count)
+            family.sitting_needs = update_data.get('sittingNeeds', family.sitting_needs)
+    else:  # sitter
+        if sitter:
+            sitter.experience = update_data.get('experience', sitter.experience)
+            if 'services' in update_data:
+                sitter.set_tags('service', update_data['services'])
+            if 'ageGroups' in update_data:
+                sitter.set_tags('age_group', update_data['ageGroups'])
+            if 'certifications' in update_data:
+                sitter.set_tags('certification', update_data['certifications'])
+            sitter.hourly_rate = update_data.get('hourlyRate', sitter.hourly_rate) or 0
+            sitter.bio = update_data.get('bio', sitter.bio)
+            sitter.is_profile_public = update_data.get('isProfilePublic', sitter.is_profile_public)
+            if {'bio', 'services', 'certifications', 'isProfilePublic'} & update_data.keys():
+                sync_sitter(sitter)
+            refresh_score(sitter)
+    
+    db.session.commit()
+    if sitter:
+        invalidate_sitter(before, sitter_buckets(sitter))
+    
+    return jsonify({'message': 'Profile updated successfully'}), 200
 
 @app.route('/api/sitter/request-verification', methods=['POST'])
+@token_required('sitter')
 def request_verification():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'message': 'Token is missing'}), 401
+    sitter = db.session.get(Sitter, g.principal.sitter_id)
     
-    try:
-        token = token.split(' ')[1]  # Remove 'Bearer ' prefix
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        user_id = data['user_id']
-        
-        user = User.query.get(user_id)
-        if not user or user.user_type != 'sitter':
-            return jsonify({'message': 'User not found or not a sitter'}), 404
-        
-        sitter = Sitter.query.filter_by(user_id=user.id).first()
-        if not sitter:
-            return jsonify({'message': 'Sitter profile not found'}), 404
-        
-        if sitter.is_verified:
-            return jsonify({'message': 'Sitter is already verified'}), 400
-        
-        # In a real application, you would store verification request details
-        # For now, we'll just mark the sitter as pending verification
-        sitter.verification_requested = True
-        db.session.commit()
-        
-        return jsonify({'message': 'Verification request submitted successfully'}), 200
+    if sitter.is_verified:
+        return jsonify({'message': 'Sitter is already verified'}), 400
     
-    except jwt.ExpiredSignatureError:
-        return jsonify({'message': 'Token has expired'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'message': 'Invalid token'}), 401
+    # In a real application, you would store verification request details
+    # For now, we'll just mark the sitter as pending verification
+    buckets = sitter_buckets(sitter)
+    sitter.verification_requested = True
+    refresh_score(sitter)
+    db.session.commit()
+    invalidate_sitter(buckets, buckets)
+    
+    return jsonify({'message': 'Verification request submitted successfully'}), 200
 
 @app.route('/api/sitter/availability', methods=['POST'])
+@token_required('sitter')
 def add_availability():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'message': 'Token is missing'}), 401
+    sitter = db.session.get(Sitter, g.principal.sitter_id)
+    buckets = sitter_buckets(sitter)
+    
+    availability_data = request.get_json()
     
     try:
-        token = token.split(' ')[1]  # Remove 'Bearer ' prefix
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        user_id = data['user_id']
-        
-        user = User.query.get(user_id)
-        if not user or user.user_type != 'sitter':
-            return jsonify({'message': 'User not found or not a sitter'}), 404
-        
-        sitter = Sitter.query.filter_by(user_id=user.id).first()
-        if not sitter:
-            return jsonify({'message': 'Sitter profile not found'}), 404
-        
-        availability_data = request.get_json()
-        
-        new_availability = Availability(
-            sitter_id=sitter.id,
-            day=availability_data['day'],
-            start_time=availability_data['startTime'],
-            end_time=availability_data['endTime']
+        intervals = slot_intervals(
+            availability_data['day'],
+            availability_data['startTime'],
+            availability_data['endTime']
         )
-        
-        db.session.add(new_availability)
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Availability added successfully',
-            'availability': {
-                'id': new_availability.id,
-                'day': new_availability.day,
-                'startTime': new_availability.start_time,
-                'endTime': new_availability.end_time
-            }
-        }), 201
+    except InvalidSchedule as e:
+        return jsonify({'message': str(e)}), 400
+    except (KeyError, TypeError):
+        return jsonify({'message': 'Availability needs a day, startTime and endTime'}), 400
     
-    except jwt.ExpiredSignatureError:
-        return jsonify({'message': 'Token has expired'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'message': 'Invalid token'}), 401
+    # An overnight slot is written as two, one either side of midnight
+    slots, replaced_ids, merged = [], [], False
+    for start_minute, end_minute in intervals:
+        # Fold any slot on the same day that overlaps or touches the new one
+        # into a single row instead of storing redundant intervals
+        day_start = start_minute - start_minute % MINUTES_PER_DAY
+        overlapping = Availability.query.filter(
+            Availability.sitter_id == sitter.id,
+            Availability.start_minute >= day_start,
+            Availability.start_minute < day_start + MINUTES_PER_DAY,
+            Availability.start_minute <= end_minute,
+            Availability.end_minute >= start_minute
+        ).order_by(Availability.start_minute).all()
+        
+        if overlapping:
+            merged = True
+            slot = overlapping[0]
+            slot.start_minute = min(start_minute, slot.start_minute)
+            slot.end_minute = max([end_minute] + [a.end_minute for a in overlapping])
+            replaced_ids.extend(a.id for a in overlapping[1:])
+            for availability in overlapping[1:]:
+                db.session.delete(availability)
+        else:
+            slot = Availability(
+                sitter_id=sitter.id,
+                start_minute=start_minute,
+                end_minute=end_minute
+            )
+            db.session.add(slot)
+        slots.append(slot)
+    
+    refresh_score(sitter)
+    db.session.commit()
+    invalidate_sitter(buckets, buckets)
+    
+    return jsonify({
+        'message': 'Availability merged with existing slots' if merged else 'Availability added successfully',
+        'availability': serialize_availability(slots[0]),
+        # Every row written, including the after-midnight part of an
+        # overnight slot
+        'slots': serialize_availabilities(slots),
+        # Slots folded into the returned ones; clients should drop them
+        'replacedIds': replaced_ids
+    }), 201
 
 @app.route('/api/sitter/availability/<int:availability_id>', methods=['DELETE'])
+@token_required('sitter')
 def delete_availability(availability_id):
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'message': 'Token is missing'}), 401
+    sitter = db.session.get(Sitter, g.principal.sitter_id)
+    
+    availability = db.session.get(Availability, availability_id)
+    if not availability or availability.sitter_id != sitter.id:
+        return jsonify({'message': 'Availability not found or not authorized'}), 404
+    
+    buckets = sitter_buckets(sitter)
+    db.session.delete(availability)
+    refresh_score(sitter)
+    db.session.commit()
+    invalidate_sitter(buckets, buckets)
+    
+    return jsonify({'message': 'Availability deleted successfully'}), 200
+
+@app.route('/api/sitter/availability', methods=['PUT'])
+@token_required('sitter')
+def replace_availability():
+    # Replaces the whole weekly schedule in one request and one transaction
+    data = request.get_json(silent=True)
+    slots = data.get('availability') if isinstance(data, dict) else data
+    if not isinstance(slots, list):
+        return jsonify({'message': 'Expected a list of availability slots'}), 400
+    if len(slots) > MAX_SCHEDULE_SLOTS:
+        return jsonify({'message': f'At most {MAX_SCHEDULE_SLOTS} slots are allowed'}), 400
     
     try:
-        token = token.split(' ')[1]  # Remove 'Bearer ' prefix
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        user_id = data['user_id']
-        
-        user = User.query.get(user_id)
-        if not user or user.user_type != 'sitter':
-            return jsonify({'message': 'User not found or not a sitter'}), 404
-        
-        sitter = Sitter.query.filter_by(user_id=user.id).first()
-        if not sitter:
-            return jsonify({'message': 'Sitter profile not found'}), 404
-        
-        availability = Availability.query.get(availability_id)
-        if not availability or availability.sitter_id != sitter.id:
-            return jsonify({'message': 'Availability not found or not authorized'}), 404
-        
-        db.session.delete(availability)
+        desired = merge_slots(
+            interval for slot in slots for interval in slot_intervals(slot['day'], slot['startTime'], slot['endTime'])
+        )
+    except InvalidSchedule as e:
+        return jsonify({'message': str(e)}), 400
+    except (KeyError, TypeError):
+        return jsonify({'message': 'Each slot needs a day, startTime and endTime'}), 400
+    
+    sitter = db.session.get(Sitter, g.principal.sitter_id)
+    buckets = sitter_buckets(sitter)
+    
+    # Slots already stored keep their row and id; everything else is one
+    # bulk DELETE and one bulk INSERT
+    stored = db.session.execute(
+        db.select(Availability.id, Availability.start_minute, Availability.end_minute)
+        .where(Availability.sitter_id == sitter.id)
+    ).all()
+    missing = set(desired)
+    kept, removed = [], []
+    for slot in stored:
+        if (slot.start_minute, slot.end_minute) in missing:
+            missing.remove((slot.start_minute, slot.end_minute))
+            kept.append(slot)
+        else:
+            removed.append(slot.id)
+    
+    if removed:
+        db.session.execute(db.delete(Availability).where(Availability.id.in_(removed)))
+    added = []
+    if missing:
+        added = db.session.execute(
+            db.insert(Availability).returning(
+                Availability.id, Availability.start_minute, Availability.end_minute, sort_by_parameter_order=True
+            ),
+            [{'sitter_id': sitter.id, 'start_minute': start, 'end_minute': end} for start, end in sorted(missing)]
+        ).all()
+    
+    if removed or added:
+        refresh_score(sitter, minutes=sum(end - start for start, end in desired))
         db.session.commit()
-        
-        return jsonify({'message': 'Availability deleted successfully'}), 200
+        invalidate_sitter(buckets, buckets)
     
-    except jwt.ExpiredSignatureError:
-        return jsonify({'message': 'Token has expired'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'message': 'Invalid token'}), 401
+    return jsonify({
+        'message': 'Availability updated successfully' if removed or added else 'Availability unchanged',
+        'availability': serialize_availabilities(sorted(kept + added, key=lambda slot: slot.start_minute)),
+        'added': len(added),
+        'removed': len(removed)
+    }), 200
 
 @app.route('/api/sitter/publish-profile', methods=['POST'])
+@token_required('sitter')
 def publish_profile():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'message': 'Token is missing'}), 401
+    sitter = db.session.get(Sitter, g.principal.sitter_id)
     
-    try:
-        token = token.split(' ')[1]  # Remove 'Bearer ' prefix
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        user_id = data['user_id']
-        
-        user = User.query.get(user_id)
-        if not user or user.user_type != 'sitter':
-            return jsonify({'message': 'User not found or not a sitter'}), 404
-        
-        sitter = Sitter.query.filter_by(user_id=user.id).first()
-        if not sitter:
-            return jsonify({'message': 'Sitter profile not found'}), 404
-        
-        # Check if profile is complete enough to publish
-        if not sitter.services or not sitter.experience or not sitter.hourly_rate:
-            return jsonify({'message': 'Profile is incomplete. Please add services, experience, and hourly rate.'}), 400
-        
-        # Check if there's at least one availability
-        availabilities = Availability.query.filter_by(sitter_id=sitter.id).first()
-        if not availabilities:
-            return jsonify({'message': 'Please add at least one availability before publishing your profile.'}), 400
-        
-        sitter.is_profile_public = True
-        db.session.commit()
-        
-        return jsonify({'message': 'Profile published successfully'}), 200
+    # Check if profile is complete enough to publish
+    if not sitter.services or not sitter.experience or not sitter.hourly_rate:
+        return jsonify({'message': 'Profile is incomplete. Please add services, experience, and hourly rate.'}), 400
     
-    except jwt.ExpiredSignatureError:
-        return jsonify({'message': 'Token has expired'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'message': 'Invalid token'}), 401
+    # Check if there's at least one availability
+    availabilities = Availability.query.filter_by(sitter_id=sitter.id).first()
+    if not availabilities:
+        return jsonify({'message': 'Please add at least one availability before publishing your profile.'}), 400
+    
+    before = sitter_buckets(sitter)
+    sitter.is_profile_public = True
+    sync_sitter(sitter)
+    refresh_score(sitter)
+    db.session.commit()
+    invalidate_sitter(before, sitter_buckets(sitter))
+    
+    return jsonify({'message': 'Profile published successfully'}), 200
 
 @app.route('/api/sitters', methods=['GET'])
+@token_required()
+@rate_limit('search', account=lambda: g.principal.user_id)
 def get_sitters():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'message': 'Token is missing'}), 401
+    # Get query parameters for filtering
+    service = request.args.get('service')
+    city = request.args.get('city')
+    is_verified = request.args.get('verified')
+    age_group = request.args.get('ageGroup')
+    day = request.args.get('day')
     
     try:
-        token = token.split(' ')[1]  # Remove 'Bearer ' prefix
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        user_id = data['user_id']
-        
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'message': 'User not found'}), 404
-        
-        # Get query parameters for filtering
-        service = request.args.get('service')
-        city = request.args.get('city')
-        is_verified = request.args.get('verified')
-        day = request.args.get('day')
-        
-        # Base query - only get public profiles
-        query = db.session.query(Sitter, User).join(User, Sitter.user_id == User.id).filter(Sitter.is_profile_public == True)
-        
-        # Apply filters
-        if service:
-            query = query.filter(Sitter.services.like(f'%{service}%'))
-        
-        if city:
-            query = query.filter(User.city == city)
-        
-        if is_verified and is_verified.lower() == 'true':
-            query = query.filter(Sitter.is_verified == True)
-        
-        if day:
-            query = query.join(Availability, Sitter.id == Availability.sitter_id).filter(Availability.day == day)
-        
-        results = query.all()
-        
-        sitters_data = []
-        for sitter, user in results:
-            # Get availability for this sitter
-            availabilities = Availability.query.filter_by(sitter_id=sitter.id).all()
-            availability_data = [
-                {
-                    'id': a.id,
-                    'day': a.day,
-                    'startTime': a.start_time,
-                    'endTime': a.end_time
-                } for a in availabilities
-            ]
-            
-            sitters_data.append({
-                'id': sitter.id,
-                'userId': user.id,
-                'firstName': user.first_name,
-                'lastName': user.last_name,
-                'city': user.city,
-                'isVerified': sitter.is_verified,
-                'services': sitter.services.split(',') if sitter.services else [],
-                'experience': sitter.experience,
-                'hourlyRate': sitter.hourly_rate,
-                'bio': sitter.bio,
-                'availability': availability_data
-            })
-        
-        return jsonify(sitters_data), 200
+        filters = {
+            'service': service,
+            'age_group': age_group,
+            'city': city,
+            'verified': bool(is_verified and is_verified.lower() == 'true'),
+            'windows': [window for window in (
+                parse_day_window(day),
+                parse_window(request.args.get('from'), request.args.get('to'), request.args.get('match'))
+            ) if window],
+            'near': parse_near(request.args.get('near'), request.args.get('radius_km')),
+            'q': parse_query(request.args.get('q')),
+            'sort': parse_sort(request.args.get('sort')),
+            'limit': parse_limit(request.args.get('limit')),
+            'cursor': request.args.get('cursor'),
+            'fields': parse_fields(request.args.get('fields'))
+        }
+        # Resolved once, so the search loads exactly what the serializer reads
+        filters['fields'] = filters['fields'] or default_fields(filters['near'])
+        
+        # Results don't depend on who is asking, so every caller shares the
+        # cached body for the same filters, and on a miss waits for an
+        # identical search that is already running instead of repeating it
+        cache = search_cache()
+        cache_key = cache.key(filters)
+        cached = cache.get(cache_key)
+        if cached is None:
+            cached, flight = cache.join(cache_key)
+        if cached is None:
+            # The page is encoded once; the same body and ETag are cached,
+            # handed to the waiting searches and sent, so the first response
+            # can already be revalidated
+            try:
+                sitters, next_cursor = search_sitters(**filters)
+                serialize = sitter_serializer(filters['fields'])
+                body = dumps([serialize(sitter) for sitter in sitters])
+            except Exception:
+                # The waiting searches run their own instead of timing out
+                flight.finish()
+                raise
+            cached = cache.store(cache_key, body, next_cursor, flight)
+    except InvalidSearch as e:
+        return jsonify({'message': str(e)}), 400
     
-    except jwt.ExpiredSignatureError:
-        return jsonify({'message': 'Token has expired'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'message': 'Invalid token'}), 401
+    next_cursor = cached['nextCursor']
+    if request.if_none_match.contains(cached['etag']):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(cached['body'], mimetype='application/json')
+    response.set_etag(cached['etag'])
+    
+    if next_cursor:
+        # The body stays a plain array; the next page is advertised in headers
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for("get_sitters", **args)}>; rel="next"'
+    return response
+
+@app.cli.command('init-db')
+def init_db_command():
+    applied = init_db()
+    print('Database ready' + (f" (applied: {', '.join(applied)})" if applied else ''))
+
+app.cli.add_command(import_users_command)
+app.cli.add_command(export_users_command)
 
 if __name__ == '__main__':
+    # Development server with the debugger and reloader; use serve.py in
+    # production
     with app.app_context():
-        db.create_all()
+        init_db()
     app.run(debug=True)
 
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+import jwt
+from flask import current_app, g, jsonify, request
+from extensions import db
+from models import User, Family, Sitter
+
+# What a protected route needs to know about the caller. Access tokens carry
+# it as claims, so checking one costs a signature check and a lookup in the
+# in-memory revocation list, not a query. None of these fields change once
+# the account exists.
+Principal = namedtuple('Principal', 'user_id user_type sitter_id family_id token_version')
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+ALGORITHM = 'HS256'
+
+
+def init_auth(app):
+    app.config.setdefault('JWT_ACCESS_TOKEN_EXPIRES', timedelta(minutes=15))
+    app.config.setdefault('JWT_REFRESH_TOKEN_EXPIRES', timedelta(days=14))
+    app.config.setdefault('TOKEN_REVOCATION_REFRESH', 10)
+    app.extensions['token_issuer'] = TokenIssuer(
+        secret=app.config['JWT_SECRET_KEY'],
+        access_expires=app.config['JWT_ACCESS_TOKEN_EXPIRES'],
+        refresh_expires=app.config['JWT_REFRESH_TOKEN_EXPIRES']
+    )
+    app.extensions['revocation_list'] = RevocationList(
+        window=app.config['JWT_REFRESH_TOKEN_EXPIRES'],
+        interval=app.config['TOKEN_REVOCATION_REFRESH']
+    )
+
+
+class TokenIssuer:
+    # A short-lived access token with the Principal as claims, and a long-lived
+    # refresh token that only names the user. Both carry the user's
+    # token_version ("tv"); bumping it revokes every token issued before.
+    #
+    # Access token claims: user_id, ut (user type), sid (sitter id), fid
+    # (family id), tv.
+
+    def __init__(self, secret, access_expires, refresh_expires):
+        self.secret = secret
+        self.access_expires = access_expires
+        self.refresh_expires = refresh_expires
+
+    def _encode(self, claims, kind, expires):
+        now = datetime.now(timezone.utc)
+        return jwt.encode({**claims, 'typ': kind, 'iat': now, 'exp': now + expires}, self.secret,
+                          algorithm=ALGORITHM)
+
+    def issue(self, principal):
+        access = {
+            'user_id': principal.user_id,
+            'ut': principal.user_type,
+            'sid': principal.sitter_id,
+            'fid': principal.family_id,
+            'tv': principal.token_version,
+        }
+        return {
+            'token': self._encode(access, ACCESS, self.access_expires),
+            'refreshToken': self._encode({'user_id': principal.user_id, 'tv': principal.token_version}, REFRESH,
+                                         self.refresh_expires),
+            'expiresIn': int(self.access_expires.total_seconds()),
+        }
+
+    def decode(self, token, kind=ACCESS):
+        data = jwt.decode(token, self.secret, algorithms=[ALGORITHM])
+        if data.get('typ') != kind:
+            raise jwt.InvalidTokenError(f'not an {kind} token')
+        return data
+
+
+class RevocationList:
+    # user_id -> lowest token_version still accepted, for every user who
+    # revoked their tokens within the last `window` (the refresh token
+    # lifetime; anything older has expired anyway). Reloaded from the
+    # database every `interval` seconds, so a revocation made by another
+    # worker process takes effect within that interval; revocations made by
+    # this process take effect at once.
+
+    def __init__(self, window, interval):
+        self.window = window
+        self.interval = interval
+        self._revoked = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        since = datetime.utcnow() - self.window
+        started = time.monotonic()
+        rows = db.session.execute(
+            db.select(User.id, User.token_version).where(User.tokens_revoked_at > since)
+        ).all()
+        self._revoked = dict(rows)
+        self._loaded_at = started
+
+    def _refresh_if_stale(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.interval:
+            return
+        # The first load has to finish before anything is accepted; after
+        # that one thread reloads while the others use the current list
+        if not self._lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.interval:
+                self._reload()
+        finally:
+            self._lock.release()
+
+    def is_revoked(self, user_id, token_version):
+        self._refresh_if_stale()
+        return token_version < self._revoked.get(user_id, 0)
+
+    def revoke(self, user_id, token_version):
+        with self._lock:
+            self._revoked[user_id] = max(token_version, self._revoked.get(user_id, 0))
+
+
+def token_issuer():
+    return current_app.extensions['token_issuer']
+
+
+def revocation_list():
+    return current_app.extensions['revocation_list']
+
+
+def issue_tokens(principal):
+    return token_issuer().issue(principal)
+
+
+def revoke_tokens(user):
+    # Invalidates every token issued to the user so far and returns the new
+    # version; pass it to revocation_list().revoke() once committed
+    user.token_version = (user.token_version or 0) + 1
+    user.tokens_revoked_at = datetime.utcnow()
+    return user.token_version
+
+
+def load_principal(user_id):
+    row = (
+        db.session.query(User.id, User.user_type, Sitter.id, Family.id, User.token_version)
+        .outerjoin(Sitter, Sitter.user_id == User.id)
+        .outerjoin(Family, Family.user_id == User.id)
+        .filter(User.id == user_id)
+        .first()
+    )
+    return Principal(*row) if row is not None else None
+
+
+def token_required(user_type=None):
+    # Decodes the bearer access token and stores the caller's Principal on
+    # g.principal. With user_type='sitter' the route only runs for users with
+    # a sitter row.
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            token = request.headers.get('Authorization')
+            if not token:
+                return jsonify({'message': 'Token is missing'}), 401
+
+            try:
+                token = token.split(' ')[1]  # Remove 'Bearer ' prefix
+                data = token_issuer().decode(token)
+            except jwt.ExpiredSignatureError:
+                return jsonify({'message': 'Token has expired'}), 401
+            except (jwt.InvalidTokenError, IndexError):
+                return jsonify({'message': 'Invalid token'}), 401
+
+            if revocation_list().is_revoked(data['user_id'], data['tv']):
+                return jsonify({'message': 'Token has been revoked'}), 401
+            principal = Principal(data['user_id'], data['ut'], data['sid'], data['fid'], data['tv'])
+            if user_type is not None and principal.user_type != user_type:
+                return jsonify({'message': f'User not found or not a {user_type}'}), 404
+            if user_type == 'sitter' and principal.sitter_id is None:
+                return jsonify({'message': 'Sitter profile not found'}), 404
+
+            g.principal = principal
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
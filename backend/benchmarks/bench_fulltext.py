@@ -0,0 +1,100 @@
+"""Compare q= full-text search through the FTS5 index against a LIKE scan
+over bios, services and certifications.
+
+    python benchmarks/bench_fulltext.py --sitters 10000
+    python benchmarks/bench_fulltext.py --sitters 100000
+"""
+import argparse
+import random
+
+from common import QueryCounter, create_app, percentile, seed_sitters, timer
+
+WORDS = [
+    'reliable', 'patient', 'caring', 'energetic', 'experienced', 'student', 'teacher', 'nurse',
+    'infant', 'toddler', 'newborn', 'twins', 'homework', 'tutoring', 'swimming', 'music',
+    'cooking', 'driving', 'pets', 'dogs', 'cats', 'weekends', 'evenings', 'overnight',
+    'spanish', 'french', 'urdu', 'arabic', 'cpr', 'certified', 'montessori', 'special', 'needs',
+]
+# Most of a bio is words nobody searches for, so the terms above are
+# reasonably selective, as they would be in real profiles
+FILLER = [f'filler{i}' for i in range(500)]
+
+QUERIES = [
+    'cpr',
+    'speaks spanish',
+    'cpr certified spanish infant experience',
+    'montessori teacher',
+    'overnight newborn twins',
+]
+
+
+def seed_bios(seed=0):
+    from extensions import db
+    from fulltext import rebuild
+    from models import Sitter
+
+    rng = random.Random(seed)
+    ids = db.session.scalars(db.select(Sitter.id)).all()
+    db.session.execute(db.update(Sitter), [
+        {'id': sitter_id, 'bio': ' '.join(rng.sample(FILLER, 20) + rng.sample(WORDS, 2))} for sitter_id in ids
+    ])
+    rebuild()
+    db.session.commit()
+
+
+def fts_search(terms, limit):
+    from search import search_sitters
+    return search_sitters(q=terms, limit=limit, fields=['id'])[0]
+
+
+def like_search(terms, limit):
+    # What q= does without an FTS index: the LIKE filter, in id order
+    from extensions import db
+    from fulltext import like_matching_ids
+    from models import Sitter
+    return (
+        db.session.query(Sitter.id)
+        .filter(Sitter.is_profile_public == True, Sitter.id.in_(like_matching_ids(terms)))
+        .order_by(Sitter.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def count_matches(impl, terms):
+    from extensions import db
+    from fulltext import like_matching_ids, matching_ids
+    select = matching_ids(terms) if impl == 'fts' else like_matching_ids(terms)
+    return db.session.scalar(db.select(db.func.count()).select_from(select.subquery()))
+
+
+def run(sitters, runs, limit):
+    app = create_app()
+    from extensions import db
+    from fulltext import parse_terms
+
+    with app.app_context():
+        seed_sitters(sitters)
+        seed_bios()
+        print(f'seeded {sitters} sitters')
+        print(f'{"query":<42} {"impl":<5} {"matches":>8} {"queries":>8} {"p50 ms":>9} {"p99 ms":>9}')
+
+        for query in QUERIES:
+            terms = parse_terms(query)
+            for impl_name, impl in (('fts', fts_search), ('like', like_search)):
+                samples = []
+                for _ in range(runs):
+                    db.session.expire_all()
+                    with QueryCounter(db.engine) as counter, timer(samples):
+                        impl(terms, limit)
+                print(f'{query:<42} {impl_name:<5} {count_matches(impl_name, terms):>8} '
+                      f'{counter.count:>8} {percentile(samples, 50):>9.1f} {percentile(samples, 99):>9.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sitters', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+    run(args.sitters, args.runs, args.limit)
@@ -0,0 +1,62 @@
+"""Logins per second per core at each password hashing cost.
+
+For every setting this times raw hash verification on one thread and the
+full POST /api/login path through the test client, which is also
+single-threaded, so both figures are per core.
+
+    python benchmarks/bench_passwords.py --logins 20
+    python benchmarks/bench_passwords.py --method scrypt:16384:8:1 --method pbkdf2:sha256:600000
+"""
+import argparse
+import time
+
+from common import create_app, percentile
+
+SETTINGS = [
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:300000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+]
+
+
+def run(methods, logins):
+    app = create_app()
+    from passwords import PasswordHasher
+    from werkzeug.security import check_password_hash, generate_password_hash
+
+    client = app.test_client()
+    print(f'{"method":<24} {"verify/s":>9} {"login/s":>9} {"p50 ms":>8} {"p99 ms":>8}')
+
+    for index, method in enumerate(methods):
+        password_hash = generate_password_hash('correct horse', method=method)
+        start = time.perf_counter()
+        for _ in range(logins):
+            check_password_hash(password_hash, 'correct horse')
+        verify_rate = logins / (time.perf_counter() - start)
+
+        app.extensions['password_hasher'] = PasswordHasher(method, workers=1, queue_size=0, timeout=60)
+        email = f'bench{index}@bench.local'
+        client.post('/api/register', json={
+            'firstName': 'Bench', 'lastName': 'User', 'email': email,
+            'password': 'correct horse', 'accountType': 'family'
+        })
+        samples = []
+        for _ in range(logins):
+            start = time.perf_counter()
+            response = client.post('/api/login', json={'email': email, 'password': 'correct horse'})
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.get_json()
+
+        print(f'{method:<24} {verify_rate:>9.1f} {1000 * len(samples) / sum(samples):>9.1f} '
+              f'{percentile(samples, 50):>8.1f} {percentile(samples, 99):>8.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--method', action='append', help='hash method to measure (repeatable)')
+    parser.add_argument('--logins', type=int, default=20)
+    args = parser.parse_args()
+    run(args.method or SETTINGS, args.logins)
@@ -0,0 +1,137 @@
+"""Measure what the rate limiter adds to a request and how well identical
+concurrent searches are coalesced.
+
+Times LocalRateLimitBackend.take() alone, from one thread and from --threads
+threads at once, then the rate_limit decorator around an empty view inside a
+request context against the same view undecorated. Limits are set high
+enough that no request is refused, so every call takes the full path. Then
+fires --concurrent identical GET /api/sitters requests at once through the
+test client and counts how many searches reached the database.
+
+    python benchmarks/bench_rate_limit.py
+    python benchmarks/bench_rate_limit.py --calls 200000 --threads 8 --concurrent 32
+"""
+import argparse
+import os
+import threading
+import time
+
+from common import QueryCounter, create_app, percentile, seed_families, seed_sitters
+
+BATCH = 1000
+
+
+def per_call(fn, calls):
+    # Mean microseconds per call over batches of BATCH calls, so the timer's
+    # own cost doesn't swamp a call that takes about a microsecond
+    samples = []
+    for _ in range(max(1, calls // BATCH)):
+        start = time.perf_counter()
+        for _ in range(BATCH):
+            fn()
+        samples.append((time.perf_counter() - start) * 1e6 / BATCH)
+    return samples
+
+
+def report(name, samples):
+    print(f'{name:<34} {percentile(samples, 50):>9.2f} {percentile(samples, 99):>9.2f}')
+
+
+def threaded(backend, threads, calls):
+    # Every thread takes from its own keys on the shared backend; returns the
+    # per-call time seen by each thread
+    samples = []
+    barrier = threading.Barrier(threads)
+
+    def worker(n):
+        keys = [f'bench:ip:10.0.{n}.{i}' for i in range(256)]
+        barrier.wait()
+        start = time.perf_counter()
+        for i in range(calls):
+            backend.take(keys[i & 255], 10 ** 9, 10 ** 9)
+        samples.append((time.perf_counter() - start) * 1e6 / calls)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return samples
+
+
+def coalescing(app, concurrent):
+    from auth import issue_tokens, load_principal
+    from extensions import db
+    from models import User
+    from search_cache import search_cache
+
+    with app.app_context():
+        # Seeded passwords aren't hashes, so the token is issued directly
+        family = User.query.filter_by(user_type='family').first()
+        token = issue_tokens(load_principal(family.id))['token']
+        cache = search_cache()
+        before = cache.flights.leaders, cache.flights.followers
+
+    barrier = threading.Barrier(concurrent)
+    statuses = []
+
+    def worker():
+        client = app.test_client()
+        barrier.wait()
+        response = client.get('/api/sitters?city=Lahore&service=babysitting',
+                              headers={'Authorization': f'Bearer {token}'})
+        response.get_data()
+        statuses.append(response.status_code)
+
+    with app.app_context(), QueryCounter(db.engine) as counter:
+        workers = [threading.Thread(target=worker) for _ in range(concurrent)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    return statuses, cache.flights.leaders - before[0], cache.flights.followers - before[1], counter.count
+
+
+def run(args):
+    # High enough that nothing is refused: the point is the cost of a check
+    unlimited = f'{10 ** 9}/second'
+    os.environ['RATE_LIMIT_ENABLED'] = 'true'
+    for name in ('LOGIN_IP', 'LOGIN_ACCOUNT', 'SEARCH_IP', 'SEARCH_ACCOUNT'):
+        os.environ[f'RATE_LIMIT_{name}'] = unlimited
+    app = create_app()
+    from ratelimit import LocalRateLimitBackend, rate_limit
+
+    print(f'{"microseconds per call":<34} {"p50":>9} {"p99":>9}')
+    backend = LocalRateLimitBackend()
+    keys = [f'bench:ip:10.0.0.{i}' for i in range(256)]
+    counter = iter(range(10 ** 12))
+    report('take(), one thread', per_call(lambda: backend.take(keys[next(counter) & 255], 10 ** 9, 10 ** 9),
+                                          args.calls))
+    report(f'take(), {args.threads} threads', threaded(backend, args.threads, args.calls // args.threads))
+
+    def view():
+        return None
+
+    limited = rate_limit('search', account=lambda: 42)(view)
+    with app.test_request_context('/api/sitters', environ_base={'REMOTE_ADDR': '10.1.2.3'}):
+        bare = per_call(view, args.calls)
+        wrapped = per_call(limited, args.calls)
+    report('view, undecorated', bare)
+    report('view, rate_limit (ip + account)', wrapped)
+    print(f'limiter overhead per request: {percentile(wrapped, 50) - percentile(bare, 50):.2f} us (p50)')
+
+    with app.app_context():
+        seed_sitters(args.sitters)
+        seed_families(10, first_id=args.sitters + 1)
+    statuses, searches, coalesced, queries = coalescing(app, args.concurrent)
+    print(f'{args.concurrent} identical concurrent searches: {searches} reached the database, '
+          f'{coalesced} shared its result, {queries} SQL statements, statuses {sorted(set(statuses))}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--sitters', type=int, default=2000)
+    parser.add_argument('--concurrent', type=int, default=16)
+    run(parser.parse_args())
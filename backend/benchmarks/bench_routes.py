@@ -0,0 +1,226 @@
+"""Benchmark every API route through the test client and check the results
+against a stored baseline.
+
+Seeds a temp SQLite database with --sitters sitters (with --slots weekly
+availability slots each) and --families families, then sends --requests
+requests to each route in turn: register, login, get_profile,
+update_profile, add_availability, publish_profile, delete_availability,
+replace_availability and get_sitters. Reports throughput, p50/p95/p99 latency and SQL statements per
+request for each.
+
+With a baseline (benchmarks/baseline.json by default) the run exits non-zero
+when a route fails more requests or issues more queries per request than it
+did, or when its p50 or p95 latency grew by more than --threshold. Latency baselines only mean
+something on the machine that recorded them; rerun with --update-baseline
+there after an intended change.
+
+    python benchmarks/bench_routes.py
+    python benchmarks/bench_routes.py --sitters 20000 --requests 500 --output results.json
+    python benchmarks/bench_routes.py --update-baseline
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from common import CITIES, SERVICES, QueryCounter, create_app, percentile, seed_families, seed_sitters
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+PASSWORD = 'correct horse'
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SEARCHES = (
+    [f'city={city}' for city in CITIES]
+    + [f'service={service}&verified=true' for service in SERVICES]
+    + ['day=Monday', 'from=Tue 18:00&to=Tue 22:00', 'near=54000&radius_km=10', 'q=experienced sitter',
+       'sort=score', 'sort=rate&city=Karachi', 'fields=id,firstName&limit=50']
+)
+
+
+def auth(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+class Routes:
+    # One method per route; each sends request number i and returns the
+    # response. State created by one route (users, slots) feeds the next, so
+    # publish runs while the sitters still have the slots add_availability
+    # gave them
+    order = ['register', 'login', 'get_profile', 'update_profile', 'add_availability', 'publish_profile',
+             'delete_availability', 'replace_availability', 'get_sitters']
+
+    def __init__(self, client):
+        self.client = client
+        self.users = []  # (email, account type, token)
+        self.slots = []
+
+    def sitters(self):
+        return [u for u in self.users if u[1] == 'sitter']
+
+    def families(self):
+        return [u for u in self.users if u[1] == 'family']
+
+    def register(self, i):
+        account_type = 'sitter' if i % 2 == 0 else 'family'
+        email = f'route{i}@bench.local'
+        response = self.client.post('/api/register', json={
+            'firstName': 'Route', 'lastName': f'User{i}', 'email': email, 'password': PASSWORD,
+            'accountType': account_type, 'city': CITIES[i % len(CITIES)], 'zipCode': '54000',
+            'services': SERVICES[:1 + i % len(SERVICES)], 'ageGroups': ['toddler'], 'experience': '3-5',
+            'hourlyRate': 15, 'bio': 'Experienced sitter', 'childrenCount': '2', 'sittingNeeds': 'weekends'
+        })
+        if response.status_code == 201:
+            self.users.append((email, account_type, response.get_json()['token']))
+        return response
+
+    def login(self, i):
+        email = self.users[i % len(self.users)][0]
+        return self.client.post('/api/login', json={'email': email, 'password': PASSWORD})
+
+    def get_profile(self, i):
+        return self.client.get('/api/profile', headers=auth(self.users[i % len(self.users)][2]))
+
+    def update_profile(self, i):
+        email, account_type, token = self.users[i % len(self.users)]
+        if account_type == 'sitter':
+            body = {'bio': f'Experienced sitter, revision {i}', 'services': SERVICES[:1 + i % len(SERVICES)]}
+        else:
+            body = {'sittingNeeds': 'evenings' if i % 2 else 'weekends'}
+        return self.client.put('/api/profile', headers=auth(token), json=body)
+
+    def add_availability(self, i):
+        sitters = self.sitters()
+        token = sitters[i % len(sitters)][2]
+        # Each pass over the sitters moves to a later, non-overlapping slot
+        hour = 6 + i // len(sitters) % 8 * 2
+        response = self.client.post('/api/sitter/availability', headers=auth(token), json={
+            'day': DAYS[i % len(DAYS)], 'startTime': f'{hour:02d}:00', 'endTime': f'{hour + 1:02d}:00'
+        })
+        if response.status_code == 201:
+            self.slots.append((token, response.get_json()['availability']['id']))
+        return response
+
+    def delete_availability(self, i):
+        token, slot_id = self.slots[i % len(self.slots)]
+        return self.client.delete(f'/api/sitter/availability/{slot_id}', headers=auth(token))
+
+    def replace_availability(self, i):
+        sitters = self.sitters()
+        # Alternates between two weekly schedules that share one slot, so each
+        # request keeps a row, deletes some and inserts some
+        evening = 18 + i // len(sitters) % 2
+        return self.client.put('/api/sitter/availability', headers=auth(sitters[i % len(sitters)][2]), json=[
+            {'day': 'Monday', 'startTime': '09:00', 'endTime': '12:00'},
+            {'day': DAYS[i % len(DAYS)], 'startTime': f'{evening}:00', 'endTime': f'{evening + 2}:00'},
+            {'day': 'Saturday', 'startTime': f'{evening - 8}:00', 'endTime': f'{evening - 6}:00'},
+        ])
+
+    def publish_profile(self, i):
+        sitters = self.sitters()
+        return self.client.post('/api/sitter/publish-profile', headers=auth(sitters[i % len(sitters)][2]))
+
+    def get_sitters(self, i):
+        families = self.families()
+        return self.client.get(f'/api/sitters?{SEARCHES[i % len(SEARCHES)]}',
+                               headers=auth(families[i % len(families)][2]))
+
+
+def measure(app, routes, name, requests):
+    from extensions import db
+
+    send = getattr(routes, name)
+    samples = []
+    errors = 0
+    with app.app_context(), QueryCounter(db.engine) as counter:
+        for i in range(requests):
+            start = time.perf_counter()
+            response = send(i)
+            samples.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput': round(1000 * requests / sum(samples), 1),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'queries': round(counter.count / requests, 2),
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    regressions = []
+    if baseline['config'] != results['config']:
+        print(f"warning: baseline was recorded with {baseline['config']}")
+    for name, base in baseline['routes'].items():
+        current = results['routes'].get(name)
+        if current is None:
+            continue
+        if current['errors'] > base['errors']:
+            regressions.append(f"{name}: {current['errors']} failed requests, baseline {base['errors']}")
+        # Query counts are deterministic, so any increase is a regression
+        if current['queries'] > base['queries'] + 0.05:
+            regressions.append(f"{name}: {current['queries']} queries per request, baseline {base['queries']}")
+        for metric in ('p50_ms', 'p95_ms'):
+            if current[metric] > base[metric] * (1 + threshold) and current[metric] - base[metric] > min_delta_ms:
+                regressions.append(f'{name}: {metric} {current[metric]:.2f}, baseline {base[metric]:.2f} '
+                                   f'(+{100 * (current[metric] / base[metric] - 1):.0f}%)')
+    return regressions
+
+
+def run(args):
+    # Cheap hashes keep register and login about the route rather than the
+    # KDF, and a zero-size search cache makes every search reach the database
+    os.environ['PASSWORD_HASH_METHOD'] = args.hash_method
+    os.environ['SEARCH_CACHE_SIZE'] = '0'
+    app = create_app()
+    config = {'sitters': args.sitters, 'families': args.families, 'slots': args.slots,
+              'requests': args.requests, 'hash_method': args.hash_method}
+
+    with app.app_context():
+        seed_sitters(args.sitters, slots_per_sitter=args.slots)
+        seed_families(args.families, first_id=args.sitters + 1)
+    print(f"seeded {args.sitters} sitters and {args.families} families")
+
+    routes = Routes(app.test_client())
+    results = {'config': config, 'routes': {}}
+    print(f'{"route":<20} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"errors":>7}')
+    for name in Routes.order:
+        result = results['routes'][name] = measure(app, routes, name, args.requests)
+        print(f"{name:<20} {result['throughput']:>9.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['queries']:>8.2f} {result['errors']:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'baseline written to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline}; run with --update-baseline to record one')
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold, args.min_delta_ms)
+    for line in regressions:
+        print(f'REGRESSION {line}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sitters', type=int, default=2000)
+    parser.add_argument('--families', type=int, default=1000)
+    parser.add_argument('--slots', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1')
+    parser.add_argument('--output', help='write the results here as JSON')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='allowed relative growth in p50 / p95 latency')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='latency changes smaller than this are noise')
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""Compare the per-row availability lookups GET /api/sitters used to do
+against the batched search layer in search.py.
+
+    python benchmarks/bench_search.py --sitters 10000 --runs 5
+"""
+import argparse
+
+from common import (CITIES, SERVICES, QueryCounter, create_app, percentile,
+                    seed_sitters, timer)
+
+
+def legacy_search(service=None, city=None, verified=False, day=None):
+    # The query GET /api/sitters ran before search.py existed, kept here as
+    # the baseline: one joined SELECT plus one Availability SELECT per row.
+    from extensions import db
+    from models import User, Sitter, Availability, Tag, sitter_tag
+    from schedule import day_window
+
+    query = db.session.query(Sitter, User).join(User, Sitter.user_id == User.id).filter(Sitter.is_profile_public == True)
+    if service:
+        query = query.join(sitter_tag, sitter_tag.c.sitter_id == Sitter.id).join(Tag).filter(Tag.name == service)
+    if city:
+        query = query.filter(User.city == city)
+    if verified:
+        query = query.filter(Sitter.is_verified == True)
+    if day:
+        start, end = day_window(day)
+        query = query.join(Availability, Sitter.id == Availability.sitter_id).filter(
+            Availability.start_minute >= start, Availability.start_minute < end)
+
+    results = []
+    for sitter, user in query.all():
+        availabilities = Availability.query.filter_by(sitter_id=sitter.id).all()
+        results.append((sitter, user, availabilities))
+    return results
+
+
+def batched_search(day=None, **filters):
+    # Walk every page so both implementations return the full result set
+    from search import MAX_PAGE_SIZE, parse_day_window, search_sitters, serialize_sitter
+    windows = [parse_day_window(day)] if day else []
+    results, cursor = [], None
+    while True:
+        sitters, cursor = search_sitters(windows=windows, limit=MAX_PAGE_SIZE, cursor=cursor, **filters)
+        results.extend(serialize_sitter(sitter) for sitter in sitters)
+        if not cursor:
+            return results
+
+
+SCENARIOS = [
+    ('all', {}),
+    ('city', {'city': CITIES[0]}),
+    ('city+service', {'city': CITIES[0], 'service': SERVICES[1]}),
+    ('city+day', {'city': CITIES[0], 'day': 'Tuesday'}),
+    ('verified+day', {'verified': True, 'day': 'Friday'}),
+]
+
+
+def run(sitters, runs):
+    app = create_app()
+    from extensions import db
+
+    with app.app_context():
+        seed_sitters(sitters)
+        print(f'seeded {sitters} sitters')
+        print(f'{"scenario":<14} {"impl":<8} {"rows":>6} {"queries":>8} {"p50 ms":>9} {"p99 ms":>9}')
+
+        for name, filters in SCENARIOS:
+            for impl_name, impl in (('legacy', legacy_search), ('batched', batched_search)):
+                samples = []
+                for _ in range(runs):
+                    db.session.expire_all()
+                    with QueryCounter(db.engine) as counter, timer(samples):
+                        rows = impl(**filters)
+                print(f'{name:<14} {impl_name:<8} {len(rows):>6} {counter.count:>8} '
+                      f'{percentile(samples, 50):>9.1f} {percentile(samples, 99):>9.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sitters', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    run(args.sitters, args.runs)
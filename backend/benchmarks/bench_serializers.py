@@ -0,0 +1,103 @@
+"""Compare the hand-built response dicts and stdlib encoding the routes used
+to do against serializers.py: field maps and orjson.
+
+Loads one full page of sitters (every field, availability included) and one
+sitter profile, then times serializing and encoding them many times over.
+
+    python benchmarks/bench_serializers.py --runs 200
+"""
+import argparse
+import json
+import time
+
+from common import create_app, percentile, seed_sitters
+
+
+def legacy_sitter(sitter, fields):
+    # search.serialize_sitter before serializers.py: look each field up in
+    # SITTER_FIELDS for every row, availability dicts built by hand
+    from search import SITTER_FIELDS
+    readers = dict(SITTER_FIELDS, availability=((), (), lambda s: [
+        {'id': a.id, 'day': a.day, 'startTime': a.start_time, 'endTime': a.end_time} for a in s.availabilities
+    ]))
+    return {field: readers[field][2](sitter) for field in fields}
+
+
+def legacy_profile(user, sitter, availabilities):
+    # get_profile's dict before serializers.py
+    profile = {
+        'id': user.id, 'firstName': user.first_name, 'lastName': user.last_name, 'email': user.email,
+        'phone': user.phone, 'address': user.address, 'city': user.city, 'zipCode': user.zip_code,
+        'userType': user.user_type,
+    }
+    profile.update({
+        'experience': sitter.experience, 'isVerified': sitter.is_verified, 'services': sitter.services,
+        'ageGroups': sitter.age_groups, 'certifications': sitter.certifications,
+        'hourlyRate': sitter.hourly_rate, 'bio': sitter.bio, 'isProfilePublic': sitter.is_profile_public,
+        'verificationRequested': sitter.verification_requested,
+    })
+    profile['availability'] = [
+        {'id': a.id, 'day': a.day, 'startTime': a.start_time, 'endTime': a.end_time} for a in availabilities
+    ]
+    return profile
+
+
+def stdlib_dumps(obj):
+    # What jsonify() did with Flask's default provider outside debug mode
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode()
+
+
+def measure(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def run(runs, slots):
+    app = create_app()
+    from extensions import db
+    from models import Availability, Sitter
+    from search import MAX_PAGE_SIZE, default_fields, search_sitters, sitter_serializer
+    from serializers import SITTER_PROFILE, USER_PROFILE, dumps, orjson, serialize_availabilities
+
+    with app.app_context():
+        seed_sitters(MAX_PAGE_SIZE * 2, slots_per_sitter=slots)
+        sitters, _ = search_sitters(limit=MAX_PAGE_SIZE)
+        fields = default_fields()
+        sitter = db.session.get(Sitter, sitters[0].id)
+        user = sitter.user
+        availabilities = Availability.query.filter_by(sitter_id=sitter.id).all()
+        serialize = sitter_serializer(fields)
+
+        cases = [
+            ('page', 'hand-built + stdlib', lambda: stdlib_dumps([legacy_sitter(s, fields) for s in sitters])),
+            ('page', 'field map + stdlib', lambda: stdlib_dumps([serialize(s) for s in sitters])),
+            ('page', 'field map + dumps', lambda: dumps([serialize(s) for s in sitters])),
+            ('profile', 'hand-built + stdlib', lambda: stdlib_dumps(legacy_profile(user, sitter, availabilities))),
+            ('profile', 'field map + dumps', lambda: dumps({
+                **USER_PROFILE(user), **SITTER_PROFILE(sitter),
+                'availability': serialize_availabilities(availabilities)
+            })),
+        ]
+
+        assert json.loads(cases[0][2]()) == json.loads(cases[2][2]())
+        assert json.loads(cases[3][2]()) == json.loads(cases[4][2]())
+        print(f'{len(sitters)} sitters per page, {slots} slots each; JSON backend: '
+              f'{"orjson" if orjson is not None else "stdlib"}')
+        print(f'{"response":<8} {"implementation":<22} {"p50 us":>9} {"p99 us":>9} {"bytes":>8}')
+        for response, name, fn in cases:
+            fn()
+            samples = measure(fn, runs)
+            print(f'{response:<8} {name:<22} {percentile(samples, 50):>9.1f} {percentile(samples, 99):>9.1f} '
+                  f'{len(fn()):>8}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--slots', type=int, default=5)
+    args = parser.parse_args()
+    run(args.runs, args.slots)
@@ -0,0 +1,106 @@
+"""Signup throughput: the old two-commit registration against the current
+single-transaction POST /api/register.
+
+Both go through the test client, against the same SQLite file, with a
+near-free password hash so the database work dominates.
+
+    python benchmarks/bench_signup.py --signups 500
+"""
+import argparse
+import time
+
+from sqlalchemy import event
+
+from common import SERVICES, QueryCounter, create_app, percentile
+
+
+def legacy_register():
+    # POST /api/register before it became one unit of work, kept here as the
+    # baseline: a duplicate-email SELECT, a commit for the user, then a second
+    # commit for the sitter row.
+    from flask import jsonify, request
+    from extensions import db
+    from models import User, Sitter
+    from passwords import password_hasher
+
+    data = request.get_json()
+    if User.query.filter_by(email=data['email']).first():
+        return jsonify({'message': 'Email already registered'}), 409
+
+    new_user = User(
+        first_name=data['firstName'],
+        last_name=data['lastName'],
+        email=data['email'],
+        password=password_hasher().hash(data['password']),
+        user_type=data['accountType'],
+        city=data.get('city', '')
+    )
+    db.session.add(new_user)
+    db.session.commit()
+
+    new_sitter = Sitter(user_id=new_user.id, hourly_rate=data.get('hourlyRate', 0))
+    new_sitter.set_tags('service', data.get('services', []))
+    new_sitter.set_tags('age_group', data.get('ageGroups', []))
+    new_sitter.set_tags('certification', data.get('certifications', []))
+    db.session.add(new_sitter)
+    db.session.commit()
+    return jsonify({'message': 'User registered successfully', 'user': {'id': new_user.id}}), 201
+
+
+def signup(index, prefix):
+    return {
+        'firstName': 'Bench',
+        'lastName': f'User{index}',
+        'email': f'{prefix}{index}@bench.local',
+        'password': 'correct horse',
+        'accountType': 'sitter',
+        'city': 'Lahore',
+        'hourlyRate': 15,
+        'services': SERVICES[:2],
+        'ageGroups': ['toddler'],
+        'certifications': ['first aid'],
+    }
+
+
+def run(signups):
+    app = create_app()
+    app.add_url_rule('/bench/legacy-register', 'legacy_register', legacy_register, methods=['POST'])
+    from extensions import db
+    from passwords import PasswordHasher
+
+    app.extensions['password_hasher'] = PasswordHasher('pbkdf2:sha256:1', workers=1, queue_size=0, timeout=60)
+    client = app.test_client()
+
+    commits = []
+    with app.app_context():
+        event.listen(db.engine, 'commit', lambda conn: commits.append(1))
+
+    print(f'{"impl":<8} {"signups/s":>10} {"queries":>8} {"commits":>8} {"p50 ms":>8} {"p99 ms":>8} {"dup ms":>8}')
+    for name, url in (('legacy', '/bench/legacy-register'), ('current', '/api/register')):
+        samples = []
+        del commits[:]
+        with app.app_context(), QueryCounter(db.engine) as counter:
+            for index in range(signups):
+                start = time.perf_counter()
+                response = client.post(url, json=signup(index, name))
+                samples.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 201, response.get_json()
+        queries, commit_count = counter.count, len(commits)
+
+        dup_samples = []
+        for index in range(min(signups, 50)):
+            start = time.perf_counter()
+            response = client.post(url, json=signup(index, name))
+            dup_samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 409, response.get_json()
+
+        print(f'{name:<8} {1000 * len(samples) / sum(samples):>10.1f} {queries / signups:>8.1f} '
+              f'{commit_count / signups:>8.1f} {percentile(samples, 50):>8.2f} {percentile(samples, 99):>8.2f} '
+              f'{percentile(dup_samples, 50):>8.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--signups', type=int, default=500)
+    args = parser.parse_args()
+    run(args.signups)
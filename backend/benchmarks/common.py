@@ -0,0 +1,161 @@
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+CITIES = ['Lahore', 'Karachi', 'Islamabad', 'Rawalpindi', 'Faisalabad']
+SERVICES = ['babysitting', 'petsitting', 'housesitting']
+
+
+def create_app(db_path=None):
+    # app.py configures itself from the environment at import time, so the
+    # database has to be chosen before the first import
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='trustsitter-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    # Benchmarks send hundreds of logins and searches from one address; the
+    # rate limiter would turn most of them into 429s
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+    from app import app
+    from migrations import init_db
+
+    with app.app_context():
+        init_db()
+    return app
+
+
+def seed_sitters(count, slots_per_sitter=3, batch_size=1000):
+    from extensions import db
+    from fulltext import rebuild
+    from geo import cell_for, locate
+    from models import User, Sitter, Availability, Tag, sitter_tag
+    from schedule import MINUTES_PER_DAY
+    from scoring import compute_score
+
+    def position(i):
+        # Scattered up to ~15 km around the city centre, same spot every run
+        lat, lng = locate(city=CITIES[i % len(CITIES)])
+        lat, lng = lat + (i * 7919 % 301 - 150) / 1000, lng + (i * 104729 % 301 - 150) / 1000
+        return {'latitude': lat, 'longitude': lng, 'geo_cell': cell_for(lat, lng)}
+
+    service_tags = Tag.get_or_create('service', SERVICES)
+    db.session.commit()
+
+    for start in range(0, count, batch_size):
+        stop = min(start + batch_size, count)
+        db.session.execute(db.insert(User), [
+            {
+                'id': i + 1,
+                'first_name': f'Sitter{i}',
+                'last_name': 'Bench',
+                'email': f'sitter{i}@bench.local',
+                'password': 'x',
+                'user_type': 'sitter',
+                'city': CITIES[i % len(CITIES)],
+                'zip_code': '',
+                **position(i),
+            } for i in range(start, stop)
+        ])
+        db.session.execute(db.insert(Sitter), [
+            {
+                'id': i + 1,
+                'user_id': i + 1,
+                'experience': '3-5',
+                'is_verified': i % 4 == 0,
+                'hourly_rate': 10 + i % 20,
+                'bio': f'Experienced sitter number {i}',
+                'is_profile_public': i % 10 != 0,
+                'search_score': compute_score(
+                    is_verified=i % 4 == 0, bio='bio', experience='3-5', services=SERVICES,
+                    available_minutes=slots_per_sitter * 8 * 60
+                ),
+            } for i in range(start, stop)
+        ])
+        db.session.execute(sitter_tag.insert(), [
+            {'sitter_id': i + 1, 'tag_id': tag.id}
+            for i in range(start, stop) for tag in service_tags[:1 + i % len(SERVICES)]
+        ])
+        db.session.execute(db.insert(Availability), [
+            {
+                'sitter_id': i + 1,
+                'start_minute': (i + slot) % 7 * MINUTES_PER_DAY + 9 * 60,
+                'end_minute': (i + slot) % 7 * MINUTES_PER_DAY + 17 * 60,
+            } for i in range(start, stop) for slot in range(slots_per_sitter)
+        ])
+        db.session.commit()
+
+    # The rows above bypass the write paths that keep sitter_fts in sync
+    rebuild()
+    db.session.commit()
+
+
+def seed_families(count, first_id, batch_size=1000):
+    # Family users with ids first_id..first_id + count - 1, so they can sit
+    # after the users seed_sitters() creates
+    from extensions import db
+    from geo import location_fields
+    from models import User, Family
+
+    for start in range(0, count, batch_size):
+        stop = min(start + batch_size, count)
+        db.session.execute(db.insert(User), [
+            {
+                'id': first_id + i,
+                'first_name': f'Family{i}',
+                'last_name': 'Bench',
+                'email': f'family{i}@bench.local',
+                'password': 'x',
+                'user_type': 'family',
+                'city': CITIES[i % len(CITIES)],
+                'zip_code': '',
+                **location_fields(city=CITIES[i % len(CITIES)]),
+            } for i in range(start, stop)
+        ])
+        db.session.execute(db.insert(Family), [
+            {
+                'user_id': first_id + i,
+                'children_count': str(1 + i % 3),
+                'children_ages': 'toddler',
+                'sitting_needs': 'weekends',
+            } for i in range(start, stop)
+        ])
+        db.session.commit()
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@contextmanager
+def timer(samples):
+    start = time.perf_counter()
+    yield
+    samples.append((time.perf_counter() - start) * 1000)
@@ -0,0 +1,201 @@
+"""Drive the API concurrently against a local server in each serving mode.
+
+Seeds a SQLite database once, then for each mode starts the server on it,
+runs a mix of searches, profile reads, logins and profile updates from
+--concurrency client threads for --duration seconds, and reports throughput
+and latency. Modes whose server is not installed are skipped.
+
+    python benchmarks/load_test.py --sitters 5000 --concurrency 32 --duration 20
+    python benchmarks/load_test.py --modes waitress gunicorn --workers 4 --threads 8
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from importlib.util import find_spec
+
+from common import BACKEND_DIR, CITIES, SERVICES, create_app, percentile, seed_sitters
+
+PASSWORD = 'load-test-password'
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'dev':
+        # The Flask development server as app.py runs it, minus the reloader
+        return [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port), '--no-reload']
+    return [sys.executable, 'serve.py', '--server', mode, '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--threads', str(threads)]
+
+
+def available(mode):
+    if mode == 'dev':
+        return True
+    if mode == 'gunicorn' and sys.platform == 'win32':
+        return False
+    return find_spec(mode) is not None
+
+
+class Client:
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            self.connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                                    headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (ConnectionError, http.client.HTTPException):
+            self.connection.close()
+            raise
+        if response.will_close:
+            self.connection.close()
+        return response.status, data
+
+
+def wait_until_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with status {process.returncode}')
+        try:
+            Client(port).request('POST', '/api/login', {'email': 'nobody@load.local', 'password': 'x'})
+            return
+        except (ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def register(client, email, account_type):
+    status, data = client.request('POST', '/api/register', {
+        'firstName': 'Load', 'lastName': 'Test', 'email': email, 'password': PASSWORD,
+        'accountType': account_type, 'city': 'Lahore', 'zipCode': '54000',
+        'services': ['babysitting'], 'experience': '3-5', 'hourlyRate': 15, 'bio': 'Load test sitter'
+    })
+    if status != 201:
+        raise RuntimeError(f'could not register {email}: {status} {data[:200]}')
+    return json.loads(data)['token']
+
+
+def scenarios(family_email, family_token, sitter_token):
+    searches = (
+        [f'/api/sitters?city={city}&limit=20' for city in CITIES]
+        + [f'/api/sitters?service={service}&verified=true&limit=20' for service in SERVICES]
+        + ['/api/sitters?near=54000&radius_km=10&limit=20', '/api/sitters?q=experienced&limit=20',
+           '/api/sitters?sort=score&limit=20', '/api/sitters?sort=rate&city=Karachi&limit=20']
+    )
+    bios = [f'Load test sitter, revision {i}' for i in range(10)]
+    # (weight, name, request) with request(client, rng) -> status
+    return [
+        (60, 'search', lambda c, rng: c.request('GET', rng.choice(searches), token=family_token)[0]),
+        (20, 'profile', lambda c, rng: c.request('GET', '/api/profile', token=family_token)[0]),
+        (10, 'login', lambda c, rng: c.request('POST', '/api/login',
+                                               {'email': family_email, 'password': PASSWORD})[0]),
+        (10, 'update', lambda c, rng: c.request('PUT', '/api/profile', {'bio': rng.choice(bios)},
+                                                token=sitter_token)[0]),
+    ]
+
+
+def drive(port, mix, concurrency, duration):
+    weights = [weight for weight, _, _ in mix]
+    results = {name: {'samples': [], 'errors': 0} for _, name, _ in mix}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = Client(port)
+        local = {name: ([], 0) for name in results}
+        while time.monotonic() < deadline:
+            _, name, send = rng.choices(mix, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = send(client, rng) < 400
+            except (ConnectionError, OSError, http.client.HTTPException):
+                ok = False
+            samples, errors = local[name]
+            samples.append((time.perf_counter() - start) * 1000)
+            local[name] = (samples, errors + (not ok))
+        with lock:
+            for name, (samples, errors) in local.items():
+                results[name]['samples'].extend(samples)
+                results[name]['errors'] += errors
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.monotonic() - started
+
+
+def run_mode(mode, port, db_path, args):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', PASSWORD_HASH_METHOD=args.hash_method,
+               RATE_LIMIT_ENABLED='false')
+    process = subprocess.Popen(server_command(mode, port, args.workers, args.threads), cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port, process)
+        client = Client(port)
+        family_email = f'family-{mode}@load.local'
+        family_token = register(client, family_email, 'family')
+        sitter_token = register(client, f'sitter-{mode}@load.local', 'sitter')
+        return drive(port, scenarios(family_email, family_token, sitter_token), args.concurrency, args.duration)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def report(mode, results, elapsed):
+    total = sum(len(r['samples']) for r in results.values())
+    errors = sum(r['errors'] for r in results.values())
+    everything = [s for r in results.values() for s in r['samples']]
+    print(f'{mode:<10} {"all":<8} {total:>8} {errors:>7} {total / elapsed:>9.1f} '
+          f'{percentile(everything, 50):>9.1f} {percentile(everything, 99):>9.1f}')
+    for name, r in results.items():
+        if r['samples']:
+            print(f'{"":<10} {name:<8} {len(r["samples"]):>8} {r["errors"]:>7} {len(r["samples"]) / elapsed:>9.1f} '
+                  f'{percentile(r["samples"], 50):>9.1f} {percentile(r["samples"], 99):>9.1f}')
+
+
+def run(args):
+    app = create_app()
+    from extensions import db
+
+    with app.app_context():
+        seed_sitters(args.sitters)
+        db_path = db.engine.url.database
+        db.engine.dispose()
+    print(f'seeded {args.sitters} sitters; {args.concurrency} clients for {args.duration}s per mode')
+    print(f'{"mode":<10} {"route":<8} {"requests":>8} {"errors":>7} {"req/s":>9} {"p50 ms":>9} {"p99 ms":>9}')
+
+    for offset, mode in enumerate(args.modes):
+        if not available(mode):
+            print(f'{mode:<10} skipped: not installed')
+            continue
+        results, elapsed = run_mode(mode, args.port + offset, db_path, args)
+        report(mode, results, elapsed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=('dev', 'waitress', 'gunicorn'),
+                        default=['dev', 'waitress', 'gunicorn'])
+    parser.add_argument('--sitters', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--port', type=int, default=5100)
+    # The default scrypt cost would make the run a password-hashing benchmark
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000')
+    run(parser.parse_args())
@@ -0,0 +1,425 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import configure_mappers, selectinload
+from werkzeug.security import generate_password_hash
+from extensions import db
+from fulltext import index_documents
+from geo import location_fields
+from models import User, Family, Sitter, Availability, Tag, sitter_tag
+from schedule import InvalidSchedule, merge_slots, slot_intervals
+from scoring import compute_score
+from search_cache import ANY, search_cache
+
+# Bulk onboarding for partner agencies: `flask import-users` streams a CSV or
+# NDJSON file and writes users in batched transactions, `flask export-users`
+# streams the directory back out in the same format.
+#
+# Records use the same field names as POST /api/register. In CSV, list fields
+# are ';'-separated and availability is written as "Monday 09:00-17:00".
+# A record may carry passwordHash instead of password to skip hashing, which
+# is what an export with --include-password-hashes produces.
+
+LIST_FIELDS = {'services': 'service', 'ageGroups': 'age_group', 'certifications': 'certification'}
+CSV_COLUMNS = [
+    'email', 'firstName', 'lastName', 'accountType', 'password', 'passwordHash',
+    'phone', 'address', 'city', 'zipCode', 'childrenCount', 'sittingNeeds',
+    'experience', 'hourlyRate', 'bio', 'isVerified', 'isProfilePublic',
+    'services', 'ageGroups', 'certifications', 'availability',
+]
+
+
+class RowError(ValueError):
+    pass
+
+
+def _open(path, mode):
+    # csv wants newline=''; NDJSON doesn't care either way
+    if path == '-':
+        return click.get_text_stream('stdin' if mode == 'r' else 'stdout')
+    return open(path, mode, newline='')
+
+
+def _format_for(path, fmt):
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_records(stream, fmt):
+    # Yields (line_number, record or RowError) without reading ahead
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('expected a JSON object')
+                yield line_number, record
+            except ValueError as e:
+                yield line_number, RowError(f'Invalid JSON: {e}')
+
+
+def _as_text(record, field):
+    # NDJSON can carry any JSON type; numbers are kept as text, anything
+    # else fails the row rather than the insert
+    value = record.get(field)
+    if value is None:
+        return ''
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise RowError(f'Invalid {field}: {value!r}')
+    return str(value)
+
+
+def _as_list(value, field):
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        return [v for v in (v.strip() for v in value.split(';')) if v]
+    if not isinstance(value, list):
+        raise RowError(f'Invalid {field}: expected a list')
+    return value
+
+
+def _as_names(value, field):
+    names = _as_list(value, field)
+    if not all(isinstance(name, str) for name in names):
+        raise RowError(f'Invalid {field}: expected a list of names')
+    return names
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def _parse_availability(value):
+    # Overlapping slots are folded together, as the availability routes do
+    slots = []
+    for slot in _as_list(value, 'availability'):
+        if isinstance(slot, str):
+            try:
+                day, times = slot.split()
+                start_time, end_time = times.split('-')
+            except ValueError:
+                raise RowError(f'Invalid availability: {slot}')
+            slot = {'day': day, 'startTime': start_time, 'endTime': end_time}
+        try:
+            slots.extend(slot_intervals(slot['day'], slot['startTime'], slot['endTime']))
+        except (InvalidSchedule, KeyError, TypeError) as e:
+            raise RowError(f'Invalid availability: {e}')
+    return merge_slots(slots)
+
+
+def parse_record(record):
+    text = {field: _as_text(record, field) for field in (
+        'email', 'firstName', 'lastName', 'accountType', 'password', 'passwordHash', 'phone', 'address',
+        'city', 'zipCode', 'childrenCount', 'sittingNeeds', 'experience', 'bio'
+    )}
+    for field in ('email', 'firstName', 'lastName', 'accountType'):
+        if not text[field]:
+            raise RowError(f'Missing {field}')
+    if text['accountType'] not in ('family', 'sitter'):
+        raise RowError(f"Unknown accountType: {text['accountType']}")
+    if not text['password'] and not text['passwordHash']:
+        raise RowError('Missing password or passwordHash')
+    try:
+        hourly_rate = float(record.get('hourlyRate') or 0)
+    except (TypeError, ValueError):
+        raise RowError(f"Invalid hourlyRate: {record['hourlyRate']}")
+
+    return {
+        'email': text['email'].strip(),
+        'password': text['password'] or None,
+        'password_hash': text['passwordHash'] or None,
+        'user': {
+            'first_name': text['firstName'],
+            'last_name': text['lastName'],
+            'user_type': text['accountType'],
+            'phone': text['phone'],
+            'address': text['address'],
+            'city': text['city'],
+            'zip_code': text['zipCode'],
+            **location_fields(text['zipCode'], text['address'], text['city']),
+        },
+        'family': {
+            'children_count': text['childrenCount'],
+            'sitting_needs': text['sittingNeeds'],
+        },
+        'sitter': {
+            'experience': text['experience'],
+            'hourly_rate': hourly_rate,
+            'bio': text['bio'],
+            'is_verified': _as_bool(record.get('isVerified', False)),
+            'is_profile_public': _as_bool(record.get('isProfilePublic', False)),
+        },
+        'tags': {kind: _as_names(record.get(field), field) for field, kind in LIST_FIELDS.items()},
+        'availability': _parse_availability(record.get('availability')),
+    }
+
+
+def _score(row):
+    return compute_score(
+        is_verified=row['sitter']['is_verified'],
+        bio=row['sitter']['bio'],
+        experience=row['sitter']['experience'],
+        services=row['tags']['service'],
+        age_groups=row['tags']['age_group'],
+        certifications=row['tags']['certification'],
+        available_minutes=sum(end - start for start, end in row['availability'])
+    )
+
+
+def _insert_batch(rows):
+    # Bulk INSERT ... RETURNING for each table; one statement per table per
+    # batch instead of one per row
+    users = db.session.execute(
+        db.insert(User).returning(User.id, sort_by_parameter_order=True),
+        [dict(row['user'], email=row['email'], password=row['password_hash']) for row in rows]
+    ).scalars().all()
+
+    families = [(row, user_id) for row, user_id in zip(rows, users) if row['user']['user_type'] == 'family']
+    if families:
+        db.session.execute(db.insert(Family), [dict(row['family'], user_id=user_id) for row, user_id in families])
+
+    sitter_rows = [(row, user_id) for row, user_id in zip(rows, users) if row['user']['user_type'] == 'sitter']
+    if not sitter_rows:
+        return
+    sitter_ids = db.session.execute(
+        db.insert(Sitter).returning(Sitter.id, sort_by_parameter_order=True),
+        [dict(row['sitter'], user_id=user_id, search_score=_score(row)) for row, user_id in sitter_rows]
+    ).scalars().all()
+
+    tag_ids = {}
+    for kind in LIST_FIELDS.values():
+        names = {name for row, _ in sitter_rows for name in row['tags'][kind]}
+        tag_ids[kind] = {tag.name: tag for tag in Tag.get_or_create(kind, names)}
+    db.session.flush()
+
+    links = {
+        (sitter_id, tag_ids[kind][Tag.normalize(name)].id)
+        for (row, _), sitter_id in zip(sitter_rows, sitter_ids)
+        for kind, names in row['tags'].items() for name in names if Tag.normalize(name)
+    }
+    if links:
+        db.session.execute(sitter_tag.insert(), [{'sitter_id': s, 'tag_id': t} for s, t in links])
+
+    index_documents([
+        {
+            'rowid': sitter_id,
+            'bio': row['sitter']['bio'] or '',
+            'services': ' '.join(Tag.normalize(name) for name in row['tags']['service']),
+            'certifications': ' '.join(Tag.normalize(name) for name in row['tags']['certification']),
+        }
+        for (row, _), sitter_id in zip(sitter_rows, sitter_ids) if row['sitter']['is_profile_public']
+    ])
+
+    slots = [
+        {'sitter_id': sitter_id, 'start_minute': start, 'end_minute': end}
+        for (row, _), sitter_id in zip(sitter_rows, sitter_ids)
+        for start, end in row['availability']
+    ]
+    if slots:
+        db.session.execute(db.insert(Availability), slots)
+
+
+def import_batch(batch, pool, method):
+    # batch is a list of (line_number, record); returns a list of
+    # (line_number, message) for rows that were not imported
+    errors, rows = [], []
+    seen = set()
+    for line_number, record in batch:
+        try:
+            if isinstance(record, RowError):
+                raise record
+            row = parse_record(record)
+            if row['email'] in seen:
+                raise RowError(f"Duplicate email in file: {row['email']}")
+            seen.add(row['email'])
+            rows.append((line_number, row))
+        except RowError as e:
+            errors.append((line_number, str(e)))
+        except (TypeError, ValueError, AttributeError) as e:
+            # Whatever parse_record didn't anticipate still only fails its row
+            errors.append((line_number, f'Invalid record: {e}'))
+
+    existing = {
+        email for (email,) in db.session.query(User.email).filter(User.email.in_([row['email'] for _, row in rows]))
+    } if rows else set()
+    for line_number, row in rows:
+        if row['email'] in existing:
+            errors.append((line_number, f"Email already registered: {row['email']}"))
+    rows = [(line_number, row) for line_number, row in rows if row['email'] not in existing]
+
+    to_hash = [row for _, row in rows if not row['password_hash']]
+    for row, password_hash in zip(to_hash, pool.map(partial(generate_password_hash, method=method),
+                                                    [row['password'] for row in to_hash], chunksize=16)):
+        row['password_hash'] = password_hash
+
+    try:
+        _insert_batch([row for _, row in rows])
+        db.session.commit()
+    except IntegrityError:
+        # Something slipped past validation (e.g. a concurrent signup took an
+        # email); fall back to one savepoint per row so only that row fails
+        db.session.rollback()
+        for line_number, row in rows:
+            try:
+                with db.session.begin_nested():
+                    _insert_batch([row])
+            except IntegrityError as e:
+                errors.append((line_number, f'Database error: {e.orig}'))
+        db.session.commit()
+
+    # Same buckets sitter_buckets() would give for each new public profile
+    failed = {line_number for line_number, _ in errors}
+    public = [row for line_number, row in rows if line_number not in failed and row['sitter']['is_profile_public']
+              and row['user']['user_type'] == 'sitter']
+    if public:
+        search_cache().invalidate(
+            {row['user']['city'] or ANY for row in public},
+            {Tag.normalize(name) for row in public for name in row['tags']['service'] if Tag.normalize(name)}
+        )
+
+    return sorted(errors)
+
+
+@click.command('import-users')
+@click.argument('path', type=click.Path(allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Password hashing processes.')
+@click.option('--errors', 'errors_path', type=click.Path(), help='Write failed rows here as NDJSON.')
+@with_appcontext
+def import_users_command(path, fmt, batch_size, workers, errors_path):
+    """Import users from a CSV or NDJSON file."""
+    fmt = _format_for(path, fmt)
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    imported = failed = 0
+    error_file = open(errors_path, 'w') if errors_path else None
+    stream = _open(path, 'r')
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            records = read_records(stream, fmt)
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                errors = import_batch(batch, pool, method)
+                imported += len(batch) - len(errors)
+                failed += len(errors)
+                for line_number, message in errors:
+                    click.echo(f'{path}:{line_number}: {message}', err=True)
+                    if error_file:
+                        error_file.write(json.dumps({'line': line_number, 'error': message}) + '\n')
+    finally:
+        if path != '-':
+            stream.close()
+        if error_file:
+            error_file.close()
+    click.echo(f'Imported {imported} users, {failed} failed')
+
+
+def export_record(user, include_password_hashes=False):
+    record = {
+        'email': user.email,
+        'firstName': user.first_name,
+        'lastName': user.last_name,
+        'accountType': user.user_type,
+        'phone': user.phone,
+        'address': user.address,
+        'city': user.city,
+        'zipCode': user.zip_code,
+    }
+    if include_password_hashes:
+        record['passwordHash'] = user.password
+    if user.family is not None:
+        record.update({
+            'childrenCount': user.family.children_count,
+            'sittingNeeds': user.family.sitting_needs,
+        })
+    if user.sitter is not None:
+        sitter = user.sitter
+        record.update({
+            'experience': sitter.experience,
+            'hourlyRate': sitter.hourly_rate,
+            'bio': sitter.bio,
+            'isVerified': sitter.is_verified,
+            'isProfilePublic': sitter.is_profile_public,
+            'services': sitter.services,
+            'ageGroups': sitter.age_groups,
+            'certifications': sitter.certifications,
+            'availability': [
+                {'day': a.day, 'startTime': a.start_time, 'endTime': a.end_time}
+                for a in sitter.availabilities
+            ],
+        })
+    return record
+
+
+def _csv_row(record):
+    row = dict(record)
+    for field in LIST_FIELDS:
+        if field in row:
+            row[field] = ';'.join(row[field])
+    if 'availability' in row:
+        row['availability'] = ';'.join(f"{a['day']} {a['startTime']}-{a['endTime']}" for a in row['availability'])
+    return row
+
+
+@click.command('export-users')
+@click.argument('path', type=click.Path(allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--include-password-hashes', is_flag=True, help='Needed to re-import the file elsewhere.')
+@with_appcontext
+def export_users_command(path, fmt, batch_size, include_password_hashes):
+    """Export every user to a CSV or NDJSON file."""
+    fmt = _format_for(path, fmt)
+    # User.family / User.sitter are backrefs and only exist once mapped
+    configure_mappers()
+    # yield_per keeps one batch of users in memory at a time; the
+    # selectinloads run once per batch rather than once per user
+    users = db.session.scalars(
+        db.select(User)
+        .options(
+            selectinload(User.family),
+            selectinload(User.sitter).selectinload(Sitter.tags),
+            selectinload(User.sitter).selectinload(Sitter.availabilities),
+        )
+        .order_by(User.id)
+        .execution_options(yield_per=batch_size)
+    )
+    count = 0
+    stream = _open(path, 'w')
+    try:
+        writer = None
+        if fmt == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+        for user in users:
+            record = export_record(user, include_password_hashes)
+            if writer:
+                writer.writerow(_csv_row(record))
+            else:
+                stream.write(json.dumps(record) + '\n')
+            count += 1
+    finally:
+        if path != '-':
+            stream.close()
+    if path != '-':
+        click.echo(f'Exported {count} users', err=True)
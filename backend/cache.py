@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    # Thread-safe LRU with a per-entry TTL. Counters are kept so the size and
+    # TTL can be tuned from real hit rates.
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+
+class Flight:
+    # One call in progress under a SingleFlight key. release() hands the
+    # result to everyone waiting, and to callers that still join, while the
+    # leader finishes up; finish() then closes the flight, after which callers
+    # start a new one. A result of None means the leader gave up without one.
+
+    def __init__(self, group, key):
+        self.group = group
+        self.key = key
+        self.result = None
+        self._done = threading.Event()
+
+    def release(self, result):
+        if not self._done.is_set():
+            self.result = result
+            self._done.set()
+
+    def finish(self, result=None):
+        if self.group is not None:
+            self.group._land(self)
+        self.release(result)
+
+    def wait(self, timeout=None):
+        # True once the flight has finished, False on timeout
+        return self._done.wait(timeout)
+
+
+class SingleFlight:
+    # Coalesces concurrent calls for the same key within this process: the
+    # first caller leads and does the work, and callers that arrive before it
+    # finishes wait for its result instead of doing the same work again.
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def join(self, key):
+        # -> (flight, True) for the leader, which must call flight.finish(),
+        #    or (flight, False) for a caller that should wait on it
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.followers += 1
+                return flight, False
+            flight = self._flights[key] = Flight(self, key)
+            self.leaders += 1
+            return flight, True
+
+    def _land(self, flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def __len__(self):
+        return len(self._flights)
+
+
+# Key/value backends for caches that may need to be shared between worker
+# processes. Values are bytes or str; every backend offers the same three
+# operations so callers don't care which one is configured.
+
+class LocalCacheBackend:
+    # In-process stand-in for a shared store. Entries live in an LRUCache;
+    # counters are kept apart so they are never evicted.
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.entries.set(key, value, ttl)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+    def stats(self):
+        return self.entries.stats()
+
+
+class RedisCacheBackend:
+    # Wraps a redis-py client, or anything with the same get/set/incr calls
+
+    def __init__(self, client, ttl=60):
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=self.ttl if ttl is None else ttl)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def get_counter(self, key):
+        return int(self.client.get(key) or 0)
+
+    def stats(self):
+        return {}
+
+
+def make_cache_backend(url, maxsize=1024, ttl=60):
+    # memory:// keeps everything in this process; redis://... is shared
+    if not url or url.startswith('memory://'):
+        return LocalCacheBackend(maxsize=maxsize, ttl=ttl)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The redis package is required for a redis:// cache URL')
+        return RedisCacheBackend(redis.Redis.from_url(url), ttl=ttl)
+    raise ValueError(f'Unsupported cache URL: {url}')
@@ -0,0 +1,75 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from extensions import db
+
+# Engine setup shared by the development server and serve.py.
+#
+# Every worker process gets its own connection pool, sized explicitly so a
+# burst of requests queues for DB_POOL_TIMEOUT seconds instead of opening
+# connections without bound. Connections are pinged before use and recycled
+# after DB_POOL_RECYCLE seconds, which matters once DATABASE_URL points at a
+# server that drops idle connections.
+#
+# On SQLite every connection is switched to WAL so readers never wait for
+# the writer, and a writer that finds the database locked waits up to
+# SQLITE_BUSY_TIMEOUT milliseconds instead of failing with "database is
+# locked". PRAGMA synchronous is left at SQLite's default (FULL, fsync on
+# every commit) unless SQLITE_SYNCHRONOUS asks otherwise: NORMAL only syncs
+# at checkpoints, which is faster under WAL but can lose the last commits if
+# the machine (not just the process) goes down.
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def engine_options(uri, pool_size, max_overflow, pool_timeout, pool_recycle):
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # An in-memory database lives in a single connection, so there is no
+        # pool to size
+        return {}
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': True,
+    }
+
+
+def _sqlite_pragmas(busy_timeout, synchronous=None):
+    if synchronous and synchronous.upper() not in SYNCHRONOUS_MODES:
+        raise ValueError(f'Invalid SQLITE_SYNCHRONOUS: {synchronous!r}, expected one of {", ".join(SYNCHRONOUS_MODES)}')
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+            cursor.execute('PRAGMA journal_mode = WAL')
+            if synchronous:
+                cursor.execute(f'PRAGMA synchronous = {synchronous.upper()}')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def init_database(app):
+    app.config.setdefault('DB_POOL_SIZE', 10)
+    app.config.setdefault('DB_MAX_OVERFLOW', 10)
+    app.config.setdefault('DB_POOL_TIMEOUT', 10)
+    app.config.setdefault('DB_POOL_RECYCLE', 1800)
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT', 5000)
+    app.config.setdefault('SQLITE_SYNCHRONOUS', '')
+    options = engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        pool_recycle=app.config['DB_POOL_RECYCLE']
+    )
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    db.init_app(app)
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect',
+                         _sqlite_pragmas(app.config['SQLITE_BUSY_TIMEOUT'], app.config['SQLITE_SYNCHRONOUS']))
@@ -0,0 +1,114 @@
+import re
+
+from sqlalchemy import column, inspect, table, text
+from sqlalchemy.orm import selectinload
+from extensions import db
+from models import Sitter, Tag, sitter_tag
+
+# Full-text search over sitter bios, services and certifications.
+#
+# On SQLite every public sitter's text is copied into the FTS5 table
+# sitter_fts (rowid = sitter.id), and q= is answered from its index. Results
+# are ranked with bm25, so sitters matching more and rarer terms come first.
+# The write paths that change the indexed text or the public flag call
+# sync_sitter() inside their own transaction. Other databases fall back to
+# LIKE matching without ranking.
+
+FTS_TABLE = 'sitter_fts'
+# bm25 weights for (bio, services, certifications): a word in a tag says
+# more than the same word somewhere in a bio
+RANK = 'bm25(1.0, 2.0, 2.0)'
+MAX_TERMS = 10
+
+sitter_fts = table(FTS_TABLE, column('rowid'), column('bio'), column('services'), column('certifications'),
+                   column('rank'))
+
+
+def enabled():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def parse_terms(q):
+    # Words only, so nothing typed into q= is read as FTS5 query syntax
+    return list(dict.fromkeys(re.findall(r'\w+', (q or '').lower())))[:MAX_TERMS]
+
+
+def match_clause(terms):
+    # Any term may match; bm25 then puts sitters matching more of them first
+    return text(f'{FTS_TABLE} MATCH :fts_query').bindparams(fts_query=' OR '.join(f'"{t}"' for t in terms))
+
+
+def _like(value, term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return value.ilike(f'%{escaped}%', escape='\\')
+
+
+def matching_ids(terms):
+    # SELECT of the sitter ids matching any of the terms
+    if enabled():
+        return db.select(sitter_fts.c.rowid).where(match_clause(terms))
+    return like_matching_ids(terms)
+
+
+def like_matching_ids(terms):
+    # The LIKE scan used when there is no FTS index: bio, or any service or
+    # certification, containing one of the terms
+    tagged = (
+        db.select(sitter_tag.c.sitter_id)
+        .join(Tag, Tag.id == sitter_tag.c.tag_id)
+        .where(Tag.kind.in_(('service', 'certification')), db.or_(*[_like(Tag.name, t) for t in terms]))
+    )
+    return db.select(Sitter.id).where(db.or_(*[_like(Sitter.bio, t) for t in terms], Sitter.id.in_(tagged)))
+
+
+def _document(sitter):
+    return {
+        'rowid': sitter.id,
+        'bio': sitter.bio or '',
+        'services': ' '.join(sitter.services),
+        'certifications': ' '.join(sitter.certifications),
+    }
+
+
+def index_documents(documents):
+    # documents are dicts shaped like _document(); replaces any existing rows
+    if not enabled() or not documents:
+        return
+    db.session.execute(sitter_fts.delete().where(sitter_fts.c.rowid.in_([d['rowid'] for d in documents])))
+    db.session.execute(sitter_fts.insert(), documents)
+
+
+def sync_sitter(sitter):
+    if not enabled():
+        return
+    if sitter.is_profile_public:
+        index_documents([_document(sitter)])
+    else:
+        db.session.execute(sitter_fts.delete().where(sitter_fts.c.rowid == sitter.id))
+
+
+def rebuild(batch_size=1000):
+    if not enabled():
+        return
+    db.session.execute(sitter_fts.delete())
+    sitters = db.session.scalars(
+        db.select(Sitter)
+        .where(Sitter.is_profile_public == True)
+        .options(selectinload(Sitter.tags))
+        .execution_options(yield_per=batch_size)
+    )
+    for batch in sitters.partitions():
+        db.session.execute(sitter_fts.insert(), [_document(sitter) for sitter in batch])
+
+
+def create_index():
+    # Called from init_db(): create_all() knows nothing about virtual tables
+    if not enabled() or inspect(db.engine).has_table(FTS_TABLE):
+        return False
+    db.session.execute(text(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(bio, services, certifications, tokenize='porter unicode61')"
+    ))
+    db.session.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('rank', '{RANK}')"))
+    rebuild()
+    db.session.commit()
+    return True
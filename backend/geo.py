@@ -0,0 +1,83 @@
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+
+# Users are placed on the map from the zip-code table bundled in
+# data/zip_centroids.csv, so nothing calls out to a geocoder. Each located
+# user also gets a geo_cell: the id of the CELL_DEGREES square grid cell they
+# fall in. A radius search reads the few cells its bounding box touches
+# through the geo_cell index and only measures distances for those users.
+
+ZIP_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'zip_centroids.csv')
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+CELL_DEGREES = 0.1  # ~11 km north-south
+GRID_COLUMNS = round(360 / CELL_DEGREES)
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 100
+
+_ZIP = re.compile(r'\b(\d{5})\b')
+
+
+@lru_cache(maxsize=1)
+def zip_table():
+    zips, cities = {}, {}
+    with open(ZIP_TABLE, newline='') as f:
+        for row in csv.DictReader(line for line in f if not line.startswith('#')):
+            point = (float(row['latitude']), float(row['longitude']))
+            zips[row['zip_code']] = point
+            cities.setdefault(row['city'].lower(), point)
+    return zips, cities
+
+
+def locate(zip_code=None, address=None, city=None):
+    # Best offline guess at (lat, lng): the zip code, then a zip code written
+    # into the address, then the city's main post office; None if unknown
+    zips, cities = zip_table()
+    for candidate in [(zip_code or '').strip()] + _ZIP.findall(address or ''):
+        if candidate in zips:
+            return zips[candidate]
+    return cities.get((city or '').strip().lower())
+
+
+def cell_for(lat, lng):
+    row = math.floor((lat + 90) / CELL_DEGREES)
+    column = math.floor((lng + 180) / CELL_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def location_fields(zip_code=None, address=None, city=None):
+    # Column values for User.latitude / longitude / geo_cell
+    point = locate(zip_code, address, city)
+    if point is None:
+        return {'latitude': None, 'longitude': None, 'geo_cell': None}
+    return {'latitude': point[0], 'longitude': point[1], 'geo_cell': cell_for(*point)}
+
+
+def locate_user(user):
+    for column, value in location_fields(user.zip_code, user.address, user.city).items():
+        setattr(user, column, value)
+
+
+def bounding_box(lat, lng, radius_km):
+    # (south, north, west, east) in degrees; longitude degrees shrink with
+    # the cosine of the latitude
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def cells_within(lat, lng, radius_km):
+    south, north, west, east = bounding_box(lat, lng, radius_km)
+    rows = range(math.floor((south + 90) / CELL_DEGREES), math.floor((north + 90) / CELL_DEGREES) + 1)
+    columns = range(math.floor((west + 180) / CELL_DEGREES), math.floor((east + 180) / CELL_DEGREES) + 1)
+    return [row * GRID_COLUMNS + column % GRID_COLUMNS for row in rows for column in columns]
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    # Haversine great-circle distance
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
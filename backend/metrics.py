@@ -0,0 +1,178 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from extensions import db
+
+# Per-route request metrics, served from /metrics in the Prometheus text
+# format: latency, SQL statements and time spent in the database per request
+# (counted with SQLAlchemy cursor events), and response sizes. Routes are
+# labelled by their URL rule, so /api/sitter/availability/<int:availability_id>
+# is one series however many ids are requested. Every process keeps its own
+# numbers; under gunicorn each worker reports only the requests it served.
+#
+# The search cache exports its own counters (hits, misses, evictions, ...)
+# next to these, so its size and TTL can be tuned from real hit rates.
+#
+# With SERVER_TIMING on, every response also carries a Server-Timing header
+# with the same request's total and database time. In debug mode a request
+# that issues more than QUERY_COUNT_WARNING statements is logged, which is
+# how an N+1 loop over a result set shows up.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# stats() key -> (metric type, help). A cache reports the keys it has.
+CACHE_STATS = {
+    'hits': ('counter', 'Cache lookups that found a live entry.'),
+    'misses': ('counter', 'Cache lookups that found no live entry.'),
+    'evictions': ('counter', 'Entries dropped to stay within the cache size.'),
+    'expirations': ('counter', 'Entries dropped on lookup after their TTL.'),
+    'invalidations': ('counter', 'Entries removed by a write to the data behind them.'),
+    'searches': ('counter', 'Searches run after a cache miss.'),
+    'coalesced': ('counter', 'Cache misses served by an identical search already running.'),
+    'size': ('gauge', 'Entries in the cache.'),
+    'maxsize': ('gauge', 'Most entries the cache holds.'),
+    'hit_rate': ('gauge', 'Share of lookups that were hits since the process started.'),
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Counts per bucket, with one more for values past the last
+                # bound, then the sum of every value
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for label_values, (counts, total) in series:
+            labels = list(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{_labels(labels + [("le", bound)])}}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{_labels(labels)}}} {total}')
+            lines.append(f'{self.name}_count{{{_labels(labels)}}} {cumulative}')
+        return '\n'.join(lines)
+
+
+class Metrics:
+    def __init__(self):
+        self.latency = Histogram('trustsitter_http_request_duration_seconds', 'Time spent handling a request.',
+                                 ('method', 'route', 'status'), LATENCY_BUCKETS)
+        self.queries = Histogram('trustsitter_http_request_db_queries', 'SQL statements issued per request.',
+                                 ('method', 'route'), QUERY_BUCKETS)
+        self.db_time = Histogram('trustsitter_http_request_db_seconds', 'Time spent in SQL statements per request.',
+                                 ('method', 'route'), DB_TIME_BUCKETS)
+        self.size = Histogram('trustsitter_http_response_size_bytes', 'Response body size.',
+                              ('method', 'route'), SIZE_BUCKETS)
+        self.caches = {}  # name -> anything with a stats() dict
+
+    def render_caches(self):
+        stats = {name: cache.stats() for name, cache in sorted(self.caches.items())}
+        lines = []
+        for key, (kind, help) in CACHE_STATS.items():
+            values = [(name, cache_stats[key]) for name, cache_stats in stats.items() if key in cache_stats]
+            if not values:
+                continue
+            name = f'trustsitter_cache_{key}_total' if kind == 'counter' else f'trustsitter_cache_{key}'
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{{{_labels([("cache", cache)])}}} {value}' for cache, value in values]
+        return lines
+
+    def render(self):
+        parts = [h.render() for h in (self.latency, self.queries, self.db_time, self.size)]
+        return '\n'.join(parts + self.render_caches()) + '\n'
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Statements outside a request (init_db, CLI commands) are not counted
+    if has_request_context() and 'request_stats' in g:
+        g.request_stats.queries += 1
+        g.request_stats.db_seconds += time.perf_counter() - context._metrics_started
+
+
+def _start_request():
+    g.request_stats = RequestStats()
+
+
+def _record_request(response):
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats.started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics = current_app.extensions['metrics']
+    metrics.latency.observe(elapsed, request.method, route, response.status_code)
+    metrics.queries.observe(stats.queries, request.method, route)
+    metrics.db_time.observe(stats.db_seconds, request.method, route)
+    size = response.calculate_content_length()
+    if size is not None:
+        metrics.size.observe(size, request.method, route)
+
+    if current_app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"'
+        )
+    threshold = current_app.config['QUERY_COUNT_WARNING']
+    if current_app.debug and threshold and stats.queries > threshold:
+        current_app.logger.warning('%s %s issued %d SQL statements (QUERY_COUNT_WARNING is %d)',
+                                   request.method, request.full_path.rstrip('?'), stats.queries, threshold)
+    return response
+
+
+def _metrics_view():
+    return Response(current_app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    app.config.setdefault('SERVER_TIMING', False)
+    app.config.setdefault('QUERY_COUNT_WARNING', 20)
+    metrics = app.extensions['metrics'] = Metrics()
+    if 'search_cache' in app.extensions:
+        metrics.caches['search'] = app.extensions['search_cache']
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', _metrics_view)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
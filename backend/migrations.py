@@ -0,0 +1,218 @@
+from flask import current_app
+from sqlalchemy import bindparam, inspect, text
+from extensions import db
+from fulltext import create_index
+from geo import location_fields
+from scoring import compute_score
+from models import Availability, Tag, sitter_tag
+from schedule import InvalidSchedule, slot_intervals
+
+# Upgrades for databases created by an older version of the models. Each step
+# inspects the live schema and does nothing when it has already been applied,
+# so init_db() is safe to run on every start.
+#
+# Steps read and write rows with plain SQL rather than through the User /
+# Sitter models: the models already carry every column, including ones a
+# later step has yet to add, so loading them mid-upgrade would fail.
+
+LEGACY_TAG_COLUMNS = (
+    ('services', 'service'),
+    ('age_groups', 'age_group'),
+    ('certifications', 'certification'),
+)
+
+
+def _columns(table):
+    return {c['name'] for c in inspect(db.engine).get_columns(table)}
+
+
+def migrate_sitter_tags():
+    # Sitter.services, age_groups and certifications used to be comma-joined
+    # strings on the sitter row; copy them into tag / sitter_tag and drop the
+    # old columns in the same transaction.
+    legacy = [(column, kind) for column, kind in LEGACY_TAG_COLUMNS if column in _columns('sitter')]
+    if not legacy:
+        return False
+
+    select_columns = ', '.join(column for column, _ in legacy)
+    rows = db.session.execute(text(f'SELECT id, {select_columns} FROM sitter')).all()
+    for row in rows:
+        for (column, kind), value in zip(legacy, row[1:]):
+            if value:
+                tags = Tag.get_or_create(kind, value.split(','))
+                db.session.flush()
+                db.session.execute(sitter_tag.insert(), [{'sitter_id': row[0], 'tag_id': tag.id} for tag in tags])
+
+    for column, _ in legacy:
+        db.session.execute(text(f'ALTER TABLE sitter DROP COLUMN {column}'))
+    db.session.commit()
+    return True
+
+
+def migrate_availability_minutes():
+    # Availability used to keep day / start_time / end_time as free-text
+    # strings. SQLite can't drop NOT NULL columns in place, so the table is
+    # rebuilt with integer minutes-of-week and the rows converted across.
+    # Overnight slots become two rows; the second gets a new id. Rows that
+    # can't be read are left in availability_legacy rather than lost.
+    if 'day' not in _columns('availability'):
+        return False
+
+    db.session.execute(text('ALTER TABLE availability RENAME TO availability_legacy'))
+    for index in inspect(db.session.connection()).get_indexes('availability_legacy'):
+        db.session.execute(text(f'DROP INDEX IF EXISTS {index["name"]}'))
+    Availability.__table__.create(db.session.connection())
+
+    rows = db.session.execute(text(
+        'SELECT id, sitter_id, day, start_time, end_time, created_at, updated_at FROM availability_legacy'
+    )).all()
+    converted, continued, unreadable = [], [], []
+    for row in rows:
+        try:
+            intervals = slot_intervals(row.day, row.start_time, row.end_time)
+        except InvalidSchedule as e:
+            current_app.logger.warning('Keeping availability %s in availability_legacy: %s', row.id, e)
+            unreadable.append(row.id)
+            continue
+        for i, (start_minute, end_minute) in enumerate(intervals):
+            (continued if i else converted).append({
+                'id': row.id,
+                'sitter_id': row.sitter_id,
+                'start_minute': start_minute,
+                'end_minute': end_minute,
+                'created_at': row.created_at,
+                'updated_at': row.updated_at,
+            })
+    if converted:
+        db.session.execute(text(
+            'INSERT INTO availability (id, sitter_id, start_minute, end_minute, created_at, updated_at) '
+            'VALUES (:id, :sitter_id, :start_minute, :end_minute, :created_at, :updated_at)'
+        ), converted)
+    if continued:
+        # After every original id is in, so the new ids can't collide
+        db.session.execute(text(
+            'INSERT INTO availability (sitter_id, start_minute, end_minute, created_at, updated_at) '
+            'VALUES (:sitter_id, :start_minute, :end_minute, :created_at, :updated_at)'
+        ), continued)
+
+    if unreadable:
+        db.session.execute(text('DELETE FROM availability_legacy WHERE id NOT IN :ids').bindparams(
+            bindparam('ids', expanding=True)), {'ids': unreadable})
+    else:
+        db.session.execute(text('DROP TABLE availability_legacy'))
+    db.session.commit()
+    return True
+
+
+def add_user_location():
+    # latitude / longitude / geo_cell were added for proximity search;
+    # add the columns and place every existing user from the zip table
+    if 'geo_cell' in _columns('user'):
+        return False
+
+    for column, column_type in (('latitude', 'FLOAT'), ('longitude', 'FLOAT'), ('geo_cell', 'INTEGER')):
+        db.session.execute(text(f'ALTER TABLE "user" ADD COLUMN {column} {column_type}'))
+    rows = db.session.execute(text('SELECT id, zip_code, address, city FROM "user"')).all()
+    located = [dict(location_fields(row.zip_code, row.address, row.city), id=row.id) for row in rows]
+    if located:
+        db.session.execute(text(
+            'UPDATE "user" SET latitude = :latitude, longitude = :longitude, geo_cell = :geo_cell WHERE id = :id'
+        ), located)
+    db.session.commit()
+    return True
+
+
+def add_search_score():
+    if 'search_score' in _columns('sitter'):
+        return False
+
+    db.session.execute(text('ALTER TABLE sitter ADD COLUMN search_score INTEGER NOT NULL DEFAULT 0'))
+    tags = {}
+    for sitter_id, kind in db.session.execute(text(
+        'SELECT sitter_tag.sitter_id, tag.kind FROM sitter_tag JOIN tag ON tag.id = sitter_tag.tag_id'
+    )):
+        tags.setdefault(sitter_id, set()).add(kind)
+    minutes = dict(db.session.execute(text(
+        'SELECT sitter_id, SUM(end_minute - start_minute) FROM availability GROUP BY sitter_id'
+    )).all())
+    scores = [
+        {
+            'id': row.id,
+            'search_score': compute_score(
+                is_verified=row.is_verified,
+                verification_requested=row.verification_requested,
+                bio=row.bio,
+                experience=row.experience,
+                services='service' in tags.get(row.id, ()),
+                age_groups='age_group' in tags.get(row.id, ()),
+                certifications='certification' in tags.get(row.id, ()),
+                available_minutes=minutes.get(row.id, 0)
+            ),
+        }
+        for row in db.session.execute(text(
+            'SELECT id, is_verified, verification_requested, bio, experience FROM sitter'
+        ))
+    ]
+    if scores:
+        db.session.execute(text('UPDATE sitter SET search_score = :search_score WHERE id = :id'), scores)
+    db.session.commit()
+    return True
+
+
+def add_token_version():
+    # token_version / tokens_revoked_at were added for token revocation
+    if 'token_version' in _columns('user'):
+        return False
+
+    db.session.execute(text('ALTER TABLE "user" ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0'))
+    db.session.execute(text('ALTER TABLE "user" ADD COLUMN tokens_revoked_at DATETIME'))
+    db.session.commit()
+    return True
+
+
+def backfill_hourly_rate():
+    # hourly_rate used to be nullable, and sort=rate can't page past a NULL.
+    # Existing SQLite tables keep the nullable column; the app no longer
+    # writes NULL to it.
+    result = db.session.execute(text('UPDATE sitter SET hourly_rate = 0 WHERE hourly_rate IS NULL'))
+    db.session.commit()
+    return result.rowcount > 0
+
+
+def create_fulltext_index():
+    # sitter_fts is an FTS5 virtual table, which create_all() can't build.
+    # Filling it loads Sitter rows, so this stays after every step that adds
+    # a column.
+    return create_index()
+
+
+def create_missing_indexes():
+    # create_all() only builds indexes together with a brand new table, so
+    # indexes added to an existing model are created here
+    inspector = inspect(db.engine)
+    created = False
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created = True
+    return created
+
+
+MIGRATIONS = [
+    migrate_sitter_tags,
+    migrate_availability_minutes,
+    add_user_location,
+    add_search_score,
+    add_token_version,
+    backfill_hourly_rate,
+    create_fulltext_index,
+    create_missing_indexes,
+]
+
+
+def init_db():
+    db.create_all()
+    applied = [migration.__name__ for migration in MIGRATIONS if migration()]
+    return applied
@@ -1,5 +1,6 @@
 from extensions import db
 from datetime import datetime
+from schedule import DAYS, MINUTES_PER_DAY, format_time
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,15 +11,22 @@ class User(db.Model):
     user_type = db.Column(db.String(20), nullable=False)  # 'family' or 'sitter'
     phone = db.Column(db.String(20))
     address = db.Column(db.String(200))
-    city = db.Column(db.String(100))
+    city = db.Column(db.String(100), index=True)
     zip_code = db.Column(db.String(20))
+    # Derived from zip_code / address / city by geo.locate_user()
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geo_cell = db.Column(db.Integer, index=True)
+    # Bumped to revoke every token issued so far; see auth.RevocationList
+    token_version = db.Column(db.Integer, nullable=False, default=0)
+    tokens_revoked_at = db.Column(db.DateTime, index=True)
     profile_photo = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Family(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     children_count = db.Column(db.String(10))
     children_ages = db.Column(db.String(200))  # Comma-separated list of age ranges
     sitting_needs = db.Column(db.String(50))
@@ -26,27 +34,122 @@ class Family(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    user = db.relationship('User', backref=db.backref('family', uselist=False))
+
+# Services, age groups and certifications live in one tag table, linked to
+# sitters through sitter_tag. The (tag_id, sitter_id) index turns a service
+# or age-group filter into an exact indexed lookup.
+sitter_tag = db.Table(
+    'sitter_tag',
+    db.Column('sitter_id', db.Integer, db.ForeignKey('sitter.id'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    db.Index('ix_sitter_tag_tag_id_sitter_id', 'tag_id', 'sitter_id')
+)
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'service', 'age_group' or 'certification'
+    name = db.Column(db.String(100), nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('kind', 'name', name='uq_tag_kind_name'),)
+
+    @staticmethod
+    def normalize(name):
+        return name.strip().lower()
+
+    @classmethod
+    def get_or_create(cls, kind, names):
+        names = list(dict.fromkeys(n for n in (cls.normalize(n) for n in names) if n))
+        if not names:
+            return []
+        existing = {t.name: t for t in cls.query.filter(cls.kind == kind, cls.name.in_(names))}
+        missing = [name for name in names if name not in existing]
+        if missing:
+            # Two requests can create the same new tag at once; the one that
+            # loses skips the row instead of failing uq_tag_kind_name, and
+            # both read the tag back
+            db.session.execute(_insert_ignoring_duplicates(cls.__table__),
+                               [{'kind': kind, 'name': name} for name in missing])
+            existing.update((t.name, t) for t in cls.query.filter(cls.kind == kind, cls.name.in_(missing)))
+        return [existing[name] for name in names]
+
+
+def _insert_ignoring_duplicates(table):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect in ('mysql', 'mariadb'):
+        return table.insert().prefix_with('IGNORE')
+    return table.insert()
+
 class Sitter(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     experience = db.Column(db.String(20))
-    services = db.Column(db.String(200))  # Comma-separated list of services
-    age_groups = db.Column(db.String(200))  # Comma-separated list of age groups
-    certifications = db.Column(db.String(200))  # Comma-separated list of certifications
     is_verified = db.Column(db.Boolean, default=False)
     verification_requested = db.Column(db.Boolean, default=False)
-    hourly_rate = db.Column(db.Float, default=0)
+    hourly_rate = db.Column(db.Float, nullable=False, default=0)  # keyset column for sort=rate
     bio = db.Column(db.Text)
     is_profile_public = db.Column(db.Boolean, default=False)
+    search_score = db.Column(db.Integer, nullable=False, default=0)  # see scoring.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # The score and rate indexes serve sort=score / sort=rate: the first page
+    # is read straight off the index in order instead of sorting all matches
+    __table_args__ = (
+        db.Index('ix_sitter_public_verified', 'is_profile_public', 'is_verified'),
+        db.Index('ix_sitter_public_score', 'is_profile_public', 'search_score', 'id'),
+        db.Index('ix_sitter_public_rate', 'is_profile_public', 'hourly_rate', 'id'),
+    )
+
+    user = db.relationship('User', backref=db.backref('sitter', uselist=False))
+    availabilities = db.relationship('Availability', backref='sitter', order_by='Availability.start_minute')
+    tags = db.relationship('Tag', secondary=sitter_tag, order_by='Tag.id')
+
+    def tag_names(self, kind):
+        return [t.name for t in self.tags if t.kind == kind]
+
+    def set_tags(self, kind, names):
+        self.tags = [t for t in self.tags if t.kind != kind] + Tag.get_or_create(kind, names)
+
+    @property
+    def services(self):
+        return self.tag_names('service')
+
+    @property
+    def age_groups(self):
+        return self.tag_names('age_group')
+
+    @property
+    def certifications(self):
+        return self.tag_names('certification')
+
 class Availability(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     sitter_id = db.Column(db.Integer, db.ForeignKey('sitter.id'), nullable=False)
-    day = db.Column(db.String(10), nullable=False)  # Monday, Tuesday, etc.
-    start_time = db.Column(db.String(10), nullable=False)  # HH:MM format
-    end_time = db.Column(db.String(10), nullable=False)  # HH:MM format
+    start_minute = db.Column(db.Integer, nullable=False)  # Minutes since Monday 00:00
+    end_minute = db.Column(db.Integer, nullable=False)  # Exclusive, same day as start_minute
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_availability_sitter_id_start_minute', 'sitter_id', 'start_minute'),
+        db.Index('ix_availability_start_end_sitter_id', 'start_minute', 'end_minute', 'sitter_id'),
+    )
+
+    @property
+    def day(self):
+        return DAYS[self.start_minute // MINUTES_PER_DAY]
+
+    @property
+    def start_time(self):
+        return format_time(self.start_minute % MINUTES_PER_DAY)
+
+    @property
+    def end_time(self):
+        return format_time(self.end_minute - self.start_minute // MINUTES_PER_DAY * MINUTES_PER_DAY)
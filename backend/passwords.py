@@ -0,0 +1,61 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing and verification run on a small, bounded thread pool
+# instead of the request thread. hashlib releases the GIL inside pbkdf2 and
+# scrypt, so the pool caps how many cores a login burst can occupy while
+# every other request keeps running; callers past the queue limit get
+# PasswordHasherBusy instead of piling up behind the KDF.
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method, workers, queue_size, timeout):
+        self.method = method
+        self.timeout = timeout
+        # The prefix werkzeug writes for this method once defaults are filled
+        # in, e.g. 'scrypt' -> 'scrypt:32768:8:1'
+        self.method_prefix = generate_password_hash('', method=method).split('$', 1)[0]
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy()
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method_prefix
+
+
+def init_passwords(app):
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    app.config.setdefault('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+    app.config.setdefault('PASSWORD_HASH_QUEUE', 32)
+    app.config.setdefault('PASSWORD_HASH_TIMEOUT', 5)
+    app.extensions['password_hasher'] = PasswordHasher(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        queue_size=app.config['PASSWORD_HASH_QUEUE'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT']
+    )
+
+
+def password_hasher():
+    return current_app.extensions['password_hasher']
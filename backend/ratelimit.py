@@ -0,0 +1,200 @@
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+# Token-bucket rate limiting for the routes that are worth abusing: login
+# (password guessing) and the sitter search (scraping).
+#
+# Every limited route has a scope with two buckets per request: one for the
+# client address and one for the account (the email being logged into, or
+# the signed-in user), so a single client can't hammer many accounts and
+# many clients can't hammer one account. A bucket holds up to `capacity`
+# tokens and refills at `rate` tokens a second; a request takes one token or
+# is answered with 429 and a Retry-After header.
+#
+# Buckets live in this process by default (memory://). Under gunicorn every
+# worker then limits on its own, so the effective limit is that many times
+# higher; a redis:// RATE_LIMIT_URL shares the buckets between processes and
+# hosts. request.remote_addr is the peer address: behind a reverse proxy,
+# wrap the app in werkzeug's ProxyFix so it is the client's.
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class InvalidRateLimit(ValueError):
+    pass
+
+
+def parse_rate(spec):
+    # '20/minute' -> (capacity 20, refilling at 20/60 tokens a second);
+    # empty or '0' turns the limit off
+    if not spec or spec.strip() == '0':
+        return None
+    try:
+        count, period = spec.split('/')
+        count = int(count)
+        seconds = PERIODS[period.strip()]
+    except (ValueError, KeyError):
+        raise InvalidRateLimit(f'Invalid rate limit: {spec!r}, expected e.g. 20/minute')
+    if count <= 0:
+        raise InvalidRateLimit(f'Invalid rate limit: {spec!r}, the count must be positive')
+    return count, count / seconds
+
+
+class LocalRateLimitBackend:
+    # Buckets in a dict under one lock. A bucket that has refilled is the
+    # same as no bucket, so once the dict reaches maxsize the full ones are
+    # dropped; if that frees nothing, everything is, which errs towards
+    # letting requests through.
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        # -> 0 when a token was taken, otherwise the seconds until one is free
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.maxsize:
+                    self._prune(now)
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return wait
+
+    def _prune(self, now):
+        full = [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]
+        for key in full:
+            del self._buckets[key]
+        if len(self._buckets) >= self.maxsize:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisRateLimitBackend:
+    # Wraps a redis-py client. The refill and take run as one Lua script, so
+    # concurrent requests from any process see a consistent bucket, and the
+    # time comes from the redis server rather than each host's clock.
+
+    SCRIPT = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = capacity
+if bucket[1] then
+    tokens = math.min(capacity, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * rate)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return tostring(wait)
+'''
+
+    def __init__(self, client, prefix='ratelimit:'):
+        self.prefix = prefix
+        self._take = client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self._take(keys=[self.prefix + key], args=[capacity, rate]))
+
+
+def make_rate_limit_backend(url, maxsize=100000):
+    # memory:// limits within this process; redis://... is shared
+    if not url or url.startswith('memory://'):
+        return LocalRateLimitBackend(maxsize=maxsize)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The redis package is required for a redis:// rate limit URL')
+        return RedisRateLimitBackend(redis.Redis.from_url(url))
+    raise ValueError(f'Unsupported rate limit URL: {url}')
+
+
+class RateLimiter:
+    def __init__(self, backend, limits):
+        # limits: {(scope, 'ip' | 'account'): (capacity, rate) or None}
+        self.backend = backend
+        self.limits = limits
+        self.rejected = 0
+        # Looked up once per request rather than once per bucket
+        self._ip = {scope: (f'{scope}:ip:', *limit) for (scope, kind), limit in limits.items()
+                    if kind == 'ip' and limit}
+        self._account = {scope: (f'{scope}:account:', *limit) for (scope, kind), limit in limits.items()
+                         if kind == 'account' and limit}
+
+    def check(self, scope, ip, account=None):
+        # -> 0 when the request may go ahead, otherwise seconds to wait. The
+        # account bucket is only touched once the address bucket let the
+        # request through.
+        for rule, who in ((self._ip.get(scope), ip), (self._account.get(scope), account)):
+            if rule is None or who is None:
+                continue
+            prefix, capacity, rate = rule
+            wait = self.backend.take(f'{prefix}{who}', capacity, rate)
+            if wait:
+                self.rejected += 1
+                return wait
+        return 0
+
+
+def init_rate_limiter(app):
+    app.config.setdefault('RATE_LIMIT_ENABLED', True)
+    app.config.setdefault('RATE_LIMIT_URL', 'memory://')
+    app.config.setdefault('RATE_LIMIT_SIZE', 100000)
+    app.config.setdefault('RATE_LIMIT_LOGIN_IP', '20/minute')
+    app.config.setdefault('RATE_LIMIT_LOGIN_ACCOUNT', '5/minute')
+    app.config.setdefault('RATE_LIMIT_SEARCH_IP', '120/minute')
+    app.config.setdefault('RATE_LIMIT_SEARCH_ACCOUNT', '60/minute')
+    if not app.config['RATE_LIMIT_ENABLED']:
+        app.extensions['rate_limiter'] = None
+        return
+    limits = {}
+    for scope in ('login', 'search'):
+        for kind in ('ip', 'account'):
+            limits[scope, kind] = parse_rate(app.config[f'RATE_LIMIT_{scope.upper()}_{kind.upper()}'])
+    backend = make_rate_limit_backend(app.config['RATE_LIMIT_URL'], maxsize=app.config['RATE_LIMIT_SIZE'])
+    app.extensions['rate_limiter'] = RateLimiter(backend, limits)
+
+
+def rate_limiter():
+    return current_app.extensions['rate_limiter']
+
+
+def rate_limit(scope, account=None):
+    # account: called inside the request to name the account it acts on, or
+    # returns None when there isn't one. Goes below token_required when it
+    # reads g.principal.
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions['rate_limiter']
+            if limiter is not None:
+                wait = limiter.check(scope, request.remote_addr, account() if account else None)
+                if wait:
+                    return (jsonify({'message': 'Too many requests, please try again later'}), 429,
+                            {'Retry-After': str(math.ceil(wait))})
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
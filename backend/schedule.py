@@ -0,0 +1,91 @@
+import re
+
+# Availability is stored as [start_minute, end_minute) offsets into the week,
+# counted from Monday 00:00. A slot never spans more than one day, which
+# bounds how far before a window a matching slot can start and lets interval
+# queries run as index range scans on start_minute. An overnight slot such as
+# Friday 22:00-02:00 is stored as two: Friday 22:00-24:00 and Saturday
+# 00:00-02:00 (Sunday night carries over to Monday).
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+MAX_SLOT_MINUTES = MINUTES_PER_DAY
+MAX_SCHEDULE_SLOTS = 100
+
+_TIME = re.compile(r'^(\d{1,2}):(\d{2})$')
+
+
+class InvalidSchedule(ValueError):
+    pass
+
+
+def parse_day(value):
+    if not isinstance(value, str):
+        raise InvalidSchedule(f'Unknown day: {value}')
+    name = value.strip().lower()
+    for index, day in enumerate(DAYS):
+        if name and (name == day.lower() or name == day[:3].lower()):
+            return index
+    raise InvalidSchedule(f'Unknown day: {value}')
+
+
+def parse_time(value):
+    # "HH:MM" -> minutes since midnight; "24:00" is allowed as an end time
+    if not isinstance(value, str):
+        raise InvalidSchedule(f'Invalid time: {value}')
+    match = _TIME.match(value.strip())
+    if not match:
+        raise InvalidSchedule(f'Invalid time: {value}')
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if minutes >= 60 or hours > 24 or (hours == 24 and minutes):
+        raise InvalidSchedule(f'Invalid time: {value}')
+    return hours * 60 + minutes
+
+
+def format_time(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def slot_intervals(day, start_time, end_time):
+    # -> [(start_minute, end_minute)], split in two at midnight when the end
+    # time is earlier than the start time
+    offset = parse_day(day) * MINUTES_PER_DAY
+    start, end = parse_time(start_time), parse_time(end_time)
+    if start >= MINUTES_PER_DAY:
+        raise InvalidSchedule(f'Invalid time: {start_time}')
+    if end == start:
+        raise InvalidSchedule('End time must be different from start time')
+    if end > start:
+        return [(offset + start, offset + end)]
+    intervals = [(offset + start, offset + MINUTES_PER_DAY)]
+    if end:
+        following = (offset + MINUTES_PER_DAY) % MINUTES_PER_WEEK
+        intervals.append((following, following + end))
+    return intervals
+
+
+def merge_slots(slots):
+    # (start, end) minute pairs -> sorted, with slots on the same day that
+    # overlap or touch folded into one, as add_availability does for a
+    # single new slot
+    merged = []
+    for start, end in sorted(slots):
+        if merged and start <= merged[-1][1] and start // MINUTES_PER_DAY == merged[-1][0] // MINUTES_PER_DAY:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def parse_week_time(value):
+    # "Tue 18:00" / "Tuesday 18:00" -> minutes since Monday 00:00
+    parts = (value or '').split()
+    if len(parts) != 2:
+        raise InvalidSchedule(f'Invalid week time: {value}')
+    return parse_day(parts[0]) * MINUTES_PER_DAY + parse_time(parts[1])
+
+
+def day_window(day):
+    start = parse_day(day) * MINUTES_PER_DAY
+    return start, start + MINUTES_PER_DAY
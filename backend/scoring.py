@@ -0,0 +1,51 @@
+from extensions import db
+from models import Availability
+
+# Sitter.search_score, the default "best first" order for sort=score. It is
+# stored rather than computed per request so that the top N sitters come
+# straight off the (is_profile_public, search_score, id) index. Every write
+# that changes one of the inputs calls refresh_score() before committing.
+#
+# Out of 100:
+#   verified                                       40 (5 while a request is pending)
+#   profile completeness (bio, experience, services,
+#   age groups, certifications)                    6 each, 30 total
+#   weekly availability, up to 40 hours            30
+
+VERIFIED_POINTS = 40
+PENDING_POINTS = 5
+COMPLETENESS_POINTS = 6
+AVAILABILITY_POINTS = 30
+FULL_AVAILABILITY_MINUTES = 40 * 60
+
+
+def compute_score(is_verified=False, verification_requested=False, bio=None, experience=None,
+                  services=(), age_groups=(), certifications=(), available_minutes=0):
+    score = VERIFIED_POINTS if is_verified else PENDING_POINTS if verification_requested else 0
+    score += COMPLETENESS_POINTS * sum(bool(part) for part in (
+        (bio or '').strip(), experience, services, age_groups, certifications
+    ))
+    score += AVAILABILITY_POINTS * min(available_minutes, FULL_AVAILABILITY_MINUTES) // FULL_AVAILABILITY_MINUTES
+    return score
+
+
+def available_minutes(sitter_id):
+    # Autoflush puts slots added or deleted in this transaction into the sum
+    return db.session.query(
+        db.func.coalesce(db.func.sum(Availability.end_minute - Availability.start_minute), 0)
+    ).filter(Availability.sitter_id == sitter_id).scalar()
+
+
+def refresh_score(sitter, minutes=None):
+    # minutes: the sitter's weekly available minutes, when the caller already
+    # knows them
+    sitter.search_score = compute_score(
+        is_verified=sitter.is_verified,
+        verification_requested=sitter.verification_requested,
+        bio=sitter.bio,
+        experience=sitter.experience,
+        services=sitter.services,
+        age_groups=sitter.age_groups,
+        certifications=sitter.certifications,
+        available_minutes=available_minutes(sitter.id) if minutes is None else minutes
+    )
@@ -0,0 +1,416 @@
+import base64
+import binascii
+import json
+import math
+
+from sqlalchemy.orm import contains_eager, load_only, selectinload
+from extensions import db
+from fulltext import enabled as fulltext_enabled, match_clause, matching_ids, parse_terms, sitter_fts
+from geo import DEFAULT_RADIUS_KM, MAX_RADIUS_KM, bounding_box, cells_within, distance_km, locate
+from models import User, Sitter, Availability, Tag, sitter_tag
+from schedule import (MAX_SLOT_MINUTES, MINUTES_PER_DAY, MINUTES_PER_WEEK, InvalidSchedule, day_window,
+                      parse_week_time)
+from serializers import FieldMap, serialize_availabilities
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+# Cursor ids and sort values are bound as SQLite INTEGERs
+MAX_CURSOR_INT = 2 ** 63 - 1
+
+# Response field -> (columns, relationships, how to read it). A field
+# projection only SELECTs the columns and loads the relationships behind the
+# fields that were asked for; primary and foreign keys are always loaded so
+# the rows can still be joined.
+SITTER_FIELDS = {
+    'id': ((), (), lambda s: s.id),
+    'userId': ((), (), lambda s: s.user.id),
+    'firstName': ((User.first_name,), (), lambda s: s.user.first_name),
+    'lastName': ((User.last_name,), (), lambda s: s.user.last_name),
+    'city': ((User.city,), (), lambda s: s.user.city),
+    'isVerified': ((Sitter.is_verified,), (), lambda s: s.is_verified),
+    'services': ((), (Sitter.tags,), lambda s: s.services),
+    'ageGroups': ((), (Sitter.tags,), lambda s: s.age_groups),
+    'certifications': ((), (Sitter.tags,), lambda s: s.certifications),
+    'experience': ((Sitter.experience,), (), lambda s: s.experience),
+    'hourlyRate': ((Sitter.hourly_rate,), (), lambda s: s.hourly_rate),
+    'bio': ((Sitter.bio,), (), lambda s: s.bio),
+    'availability': ((), (Sitter.availabilities,), lambda s: serialize_availabilities(s.availabilities)),
+    # Set by a proximity search only
+    'distanceKm': ((), (), lambda s: round(s.distance_km, 2) if hasattr(s, 'distance_km') else None),
+}
+
+
+# sort= -> (column, descending). Ties are broken on id in the same direction,
+# matching the (is_profile_public, column, id) indexes.
+SORTS = {
+    'score': (Sitter.search_score, True),
+    'rate': (Sitter.hourly_rate, False),
+}
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def parse_fields(value):
+    # None (the default fields) when no field names are given, so fields=,
+    # can't turn into an empty projection
+    fields = [f.strip() for f in (value or '').split(',') if f.strip()]
+    if not fields:
+        return None
+    unknown = [f for f in fields if f not in SITTER_FIELDS]
+    if unknown:
+        raise InvalidSearch(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def default_fields(near=None):
+    # distanceKm is only part of the default response for a near= search
+    return [field for field in SITTER_FIELDS if near or field != 'distanceKm']
+
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidSearch('limit must be an integer')
+    if limit < 1:
+        raise InvalidSearch('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_window(start=None, end=None, match=None):
+    # from=Tue 18:00&to=Tue 22:00 -> (start_minute, end_minute, cover). With
+    # match=cover the window has to be spanned by a slot (one per day, for a
+    # window across midnight), otherwise any overlap counts. A window that ends before it starts runs on into the next week,
+    # so from=Sun 22:00&to=Mon 02:00 ends at minute MINUTES_PER_WEEK + 120.
+    if start is None and end is None:
+        return None
+    if start is None or end is None:
+        raise InvalidSearch('from and to must be given together')
+    if match not in (None, 'overlap', 'cover'):
+        raise InvalidSearch('match must be overlap or cover')
+    try:
+        window = (parse_week_time(start), parse_week_time(end))
+    except InvalidSchedule as e:
+        raise InvalidSearch(str(e))
+    if window[1] == window[0]:
+        raise InvalidSearch('to must be different from from')
+    if window[1] < window[0]:
+        window = (window[0], window[1] + MINUTES_PER_WEEK)
+    return window + (match == 'cover',)
+
+
+def parse_day_window(day):
+    if not day:
+        return None
+    try:
+        return day_window(day) + (False,)
+    except InvalidSchedule as e:
+        raise InvalidSearch(str(e))
+
+
+def parse_sort(value):
+    if not value:
+        return None
+    if value not in SORTS:
+        raise InvalidSearch(f"sort must be one of: {', '.join(SORTS)}")
+    return value
+
+
+def parse_query(q):
+    # q=cpr spanish infant -> ['cpr', 'spanish', 'infant']
+    if q is None:
+        return None
+    terms = parse_terms(q)
+    if not terms:
+        raise InvalidSearch('q must contain at least one word')
+    return terms
+
+
+def parse_near(near=None, radius_km=None):
+    # near=54000 (a zip code) or near=31.52,74.35 -> (lat, lng, radius_km)
+    if not near:
+        if radius_km is not None:
+            raise InvalidSearch('radius_km needs near')
+        return None
+    try:
+        radius = float(radius_km) if radius_km is not None else DEFAULT_RADIUS_KM
+    except ValueError:
+        raise InvalidSearch('radius_km must be a number')
+    if not 0 < radius <= MAX_RADIUS_KM:
+        raise InvalidSearch(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+
+    if ',' in near:
+        try:
+            lat, lng = (float(part) for part in near.split(','))
+        except ValueError:
+            raise InvalidSearch(f'Invalid coordinates: {near}')
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise InvalidSearch(f'Invalid coordinates: {near}')
+    else:
+        point = locate(zip_code=near)
+        if point is None:
+            raise InvalidSearch(f'Unknown zip code: {near}')
+        lat, lng = point
+    return lat, lng, radius
+
+
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _cursor_number(value, integer=False):
+    # A number the database can compare against: a 64-bit integer, or a
+    # finite float unless integer is set
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -MAX_CURSOR_INT - 1 <= value <= MAX_CURSOR_INT
+    return not integer and isinstance(value, float) and math.isfinite(value)
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError):
+        raise InvalidSearch('Invalid cursor')
+    if not isinstance(position, dict) or not _cursor_number(position.get('id'), integer=True):
+        raise InvalidSearch('Invalid cursor')
+    return position
+
+
+def _tagged(kind, name):
+    # Exact match through the unique (kind, name) tag and the
+    # (tag_id, sitter_id) link index
+    return (
+        db.select(sitter_tag.c.sitter_id)
+        .join(Tag, Tag.id == sitter_tag.c.tag_id)
+        .where(Tag.kind == kind, Tag.name == Tag.normalize(name))
+    )
+
+
+def _day_parts(start, end):
+    # A window split at each midnight it crosses; a part after Sunday
+    # midnight is moved back to the start of the week
+    parts = []
+    while start < end:
+        stop = min(end, (start // MINUTES_PER_DAY + 1) * MINUTES_PER_DAY)
+        parts.append((start % MINUTES_PER_WEEK, (stop - 1) % MINUTES_PER_WEEK + 1))
+        start = stop
+    return parts
+
+
+def _available(start, end, cover):
+    # Slots are at most MAX_SLOT_MINUTES long, so any slot that can match
+    # starts inside a bounded range and the lookup stays a range scan on the
+    # (start_minute, end_minute, sitter_id) index
+    if end > MINUTES_PER_WEEK:
+        # The part past Sunday midnight is looked up from Monday 00:00
+        return db.union(_available(start, MINUTES_PER_WEEK, False), _available(0, end - MINUTES_PER_WEEK, False))
+    if cover:
+        condition = db.and_(
+            Availability.start_minute >= end - MAX_SLOT_MINUTES,
+            Availability.start_minute <= start,
+            Availability.end_minute >= end
+        )
+    else:
+        condition = db.and_(
+            Availability.start_minute > start - MAX_SLOT_MINUTES,
+            Availability.start_minute < end,
+            Availability.end_minute > start
+        )
+    return db.select(Availability.sitter_id).where(condition)
+
+
+def _mostly_true(condition):
+    # Without ANALYZE statistics SQLite rates is_profile_public = 1 as a
+    # selective index lookup and would drive a near= search from every public
+    # sitter; likelihood() tells it most rows pass, so it starts from the
+    # geo_cell index instead
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.likelihood(condition, db.literal_column('0.9'))
+    return condition
+
+
+def _nearest(query, near, position, limit):
+    # Candidates come from the geo_cell index, trimmed to the bounding box;
+    # exact distances are only computed for those rows. Returns up to limit
+    # (distance, sitter_id) pairs after the cursor position, nearest first.
+    lat, lng, radius = near
+    south, north, west, east = bounding_box(lat, lng, radius)
+    candidates = (
+        query
+        .filter(User.geo_cell.in_(cells_within(lat, lng, radius)), User.latitude.between(south, north))
+        .with_entities(Sitter.id, User.latitude, User.longitude)
+    )
+    if -180 <= west and east <= 180:
+        candidates = candidates.filter(User.longitude.between(west, east))
+
+    ranked = sorted(
+        (distance, sitter_id) for distance, sitter_id in (
+            (distance_km(lat, lng, sitter_lat, sitter_lng), sitter_id)
+            for sitter_id, sitter_lat, sitter_lng in candidates
+        ) if distance <= radius
+    )
+    if position:
+        ranked = [entry for entry in ranked if entry > (position['distance'], position['id'])]
+    return ranked[:limit]
+
+
+def _relevant(query, terms, options, position, limit):
+    # Full-text matches best first. bm25 ranks are negative (lower is
+    # better), so the keyset is (rank, id) ascending. Returns (sitters, ranks).
+    rank = sitter_fts.c.rank
+    query = query.join(sitter_fts, sitter_fts.c.rowid == Sitter.id).filter(match_clause(terms))
+    if position:
+        if not _cursor_number(position.get('rank')):
+            raise InvalidSearch('Invalid cursor')
+        query = query.filter(db.or_(rank > position['rank'], db.and_(rank == position['rank'], Sitter.id > position['id'])))
+    rows = query.options(*options).add_columns(rank).order_by(rank, Sitter.id).limit(limit).all()
+    return [sitter for sitter, _ in rows], [r for _, r in rows]
+
+
+def _sorted(query, sort, position, limit):
+    # Keyset on (column, id): each page starts after the last row of the
+    # previous one in the index order
+    column, descending = SORTS[sort]
+    if position:
+        value = position.get('value')
+        if not _cursor_number(value):
+            raise InvalidSearch('Invalid cursor')
+        # A row-value comparison, so the index seeks straight to the position
+        key = db.tuple_(column, Sitter.id)
+        query = query.filter(key < (value, position['id']) if descending else key > (value, position['id']))
+    order = (column.desc(), Sitter.id.desc()) if descending else (column, Sitter.id)
+    sitters = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(sitters) > limit:
+        sitters = sitters[:limit]
+        next_cursor = encode_cursor({'value': getattr(sitters[-1], column.key), 'id': sitters[-1].id})
+    return sitters, next_cursor
+
+
+def search_sitters(service=None, age_group=None, city=None, verified=False, windows=(), near=None, q=None,
+                   sort=None, limit=None, cursor=None, fields=None):
+    # Sitter and User come back in one joined SELECT, and the availability
+    # slots and tags for the whole page in one more each, so a search costs a
+    # fixed number of queries no matter how many sitters match.
+    #
+    # With near=(lat, lng, radius_km) the results are sorted by distance
+    # instead of id and each sitter carries a distance_km attribute. With
+    # q=[terms] and no near they are sorted by full-text relevance. sort=
+    # ('score' or 'rate', see SORTS) overrides relevance and can't be combined
+    # with near.
+    #
+    # Returns (sitters, next_cursor); next_cursor is None on the last page.
+    if near and sort:
+        raise InvalidSearch('sort cannot be combined with near')
+
+    query = db.session.query(Sitter).join(Sitter.user)
+    public = Sitter.is_profile_public == True
+
+    if service:
+        query = query.filter(Sitter.id.in_(_tagged('service', service)))
+
+    if age_group:
+        query = query.filter(Sitter.id.in_(_tagged('age_group', age_group)))
+
+    if city:
+        query = query.filter(User.city == city)
+
+    if verified:
+        query = query.filter(Sitter.is_verified == True)
+
+    # IN (SELECT ...) rather than a join, so a sitter with several matching
+    # slots still appears once. Slots never cross midnight, so a cover window
+    # that does needs one covering slot for each day it touches.
+    for start, end, cover in windows:
+        for part in (_day_parts(start, end) if cover else [(start, end)]):
+            query = query.filter(Sitter.id.in_(_available(*part, cover)))
+
+    # Relevance order needs the FTS index; otherwise q= is only a filter
+    relevance = bool(q) and not near and not sort and fulltext_enabled()
+    if q and not relevance:
+        query = query.filter(Sitter.id.in_(matching_ids(q)))
+
+    if not fields:
+        fields = default_fields(near)
+    columns = [column for field in fields for column in SITTER_FIELDS[field][0]]
+    if sort:
+        # The cursor is built from the sort column, so it has to be loaded
+        columns.append(SORTS[sort][0])
+    relationships = {rel for field in fields for rel in SITTER_FIELDS[field][1]}
+    options = (
+        load_only(Sitter.id, Sitter.user_id, *[c for c in columns if c.class_ is Sitter]),
+        contains_eager(Sitter.user).load_only(User.id, *[c for c in columns if c.class_ is User]),
+        *[selectinload(rel) for rel in relationships]
+    )
+
+    position = decode_cursor(cursor)
+    limit = limit or DEFAULT_PAGE_SIZE
+
+    if near:
+        # Keyset on (distance, id), the order the page was ranked in
+        if position and not _cursor_number(position.get('distance')):
+            raise InvalidSearch('Invalid cursor')
+        ranked = _nearest(query.filter(_mostly_true(public)), near, position, limit + 1)
+        page = ranked[:limit]
+        if not page:
+            return [], None
+        by_id = {
+            sitter.id: sitter for sitter in
+            db.session.query(Sitter).join(Sitter.user).options(*options).filter(Sitter.id.in_([i for _, i in page]))
+        }
+        sitters = []
+        for distance, sitter_id in page:
+            by_id[sitter_id].distance_km = distance
+            sitters.append(by_id[sitter_id])
+        next_cursor = None
+        if len(ranked) > limit:
+            next_cursor = encode_cursor({'distance': page[-1][0], 'id': page[-1][1]})
+        return sitters, next_cursor
+
+    query = query.filter(public)
+
+    if relevance:
+        sitters, ranks = _relevant(query, q, options, position, limit + 1)
+        next_cursor = None
+        if len(sitters) > limit:
+            sitters = sitters[:limit]
+            next_cursor = encode_cursor({'rank': ranks[limit - 1], 'id': sitters[-1].id})
+        return sitters, next_cursor
+
+    if sort:
+        return _sorted(query.options(*options), sort, position, limit)
+
+    # Keyset pagination on the primary key: each page starts after the last
+    # id of the previous one, so deep pages cost the same as the first.
+    if position:
+        query = query.filter(Sitter.id > position['id'])
+
+    sitters = query.options(*options).order_by(Sitter.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(sitters) > limit:
+        sitters = sitters[:limit]
+        next_cursor = encode_cursor({'id': sitters[-1].id})
+    return sitters, next_cursor
+
+
+SITTER = FieldMap({field: read for field, (_, _, read) in SITTER_FIELDS.items()})
+
+
+def sitter_serializer(fields=None):
+    return SITTER.serializer(fields or default_fields())
+
+
+def serialize_sitter(sitter, fields=None):
+    return sitter_serializer(fields)(sitter)
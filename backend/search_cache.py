@@ -0,0 +1,130 @@
+import hashlib
+import json
+
+from flask import current_app
+from cache import Flight, SingleFlight, make_cache_backend
+from models import Tag
+from serializers import dumps, loads
+
+# Cached GET /api/sitters responses, keyed on the normalized filters.
+#
+# Every entry belongs to one (city, service) bucket, with '*' standing in for
+# "not filtered on". Each bucket has a version counter that is part of the
+# entry key, so invalidating a bucket is one increment and stale entries are
+# simply never read again (they age out through the TTL). A change to a
+# sitter in city C offering services S bumps (C, s), (C, *), (*, s) and (*, *)
+# for every s in S: exactly the buckets whose results could contain them.
+#
+# Misses are coalesced per process: while one request runs a search, identical
+# searches wait for its entry instead of sending the same query to the
+# database, so a burst on a popular filter costs one execution rather than
+# one per request.
+
+ANY = '*'
+
+
+class SearchCache:
+    def __init__(self, backend, ttl=60, flight_timeout=5):
+        self.backend = backend
+        self.ttl = ttl
+        self.flight_timeout = flight_timeout
+        self.flights = SingleFlight()
+
+    def _version_key(self, city, service):
+        return f'sitters:v:{city}:{service}'
+
+    def key(self, filters):
+        city = filters.get('city') or ANY
+        service = Tag.normalize(filters['service']) if filters.get('service') else ANY
+        version = self.backend.get_counter(self._version_key(city, service))
+        digest = hashlib.sha1(json.dumps(filters, sort_keys=True, default=list).encode()).hexdigest()
+        return f'sitters:{city}:{service}:{version}:{digest}'
+
+    def get(self, key):
+        value = self.backend.get(key)
+        return loads(value) if value is not None else None
+
+    def set(self, key, entry):
+        self.backend.set(key, dumps(entry), self.ttl)
+
+    def join(self, key):
+        # -> (entry, None) when an identical search already running here
+        # produced the entry, or (None, flight) when the caller has to run
+        # the search itself and pass the flight to fill()
+        while True:
+            flight, leader = self.flights.join(key)
+            if leader:
+                return None, flight
+            if not flight.wait(self.flight_timeout):
+                # The leader is taking too long; search alone rather than
+                # queue behind it
+                return None, Flight(None, key)
+            if flight.result is not None:
+                return flight.result, None
+            # The leader failed or gave up; try again, leading if no one else is
+
+    def store(self, key, body, next_cursor, flight=None):
+        # Hands an encoded page and its ETag to the searches waiting on
+        # flight, then caches it; returns the entry. Waiters are released as
+        # soon as the body exists, not once a shared backend has stored it or
+        # the leader's client has read it, and the flight only closes once
+        # the entry can be read from the cache.
+        entry = {
+            'body': body.decode(),
+            'etag': hashlib.sha1(body).hexdigest(),
+            'nextCursor': next_cursor
+        }
+        if flight is None:
+            self.set(key, entry)
+            return entry
+        flight.release(entry)
+        try:
+            self.set(key, entry)
+        finally:
+            flight.finish()
+        return entry
+
+    def invalidate(self, cities, services):
+        for city in set(cities) | {ANY}:
+            for service in set(services) | {ANY}:
+                self.backend.incr(self._version_key(city, service))
+
+    def stats(self):
+        return {**self.backend.stats(), 'searches': self.flights.leaders, 'coalesced': self.flights.followers}
+
+
+def init_search_cache(app):
+    app.config.setdefault('SEARCH_CACHE_URL', 'memory://')
+    app.config.setdefault('SEARCH_CACHE_SIZE', 1024)
+    app.config.setdefault('SEARCH_CACHE_TTL', 60)
+    app.config.setdefault('SEARCH_FLIGHT_TIMEOUT', 5)
+    backend = make_cache_backend(
+        app.config['SEARCH_CACHE_URL'],
+        maxsize=app.config['SEARCH_CACHE_SIZE'],
+        ttl=app.config['SEARCH_CACHE_TTL']
+    )
+    app.extensions['search_cache'] = SearchCache(
+        backend,
+        ttl=app.config['SEARCH_CACHE_TTL'],
+        flight_timeout=app.config['SEARCH_FLIGHT_TIMEOUT']
+    )
+
+
+def search_cache():
+    return current_app.extensions['search_cache']
+
+
+def sitter_buckets(sitter):
+    # (cities, services) whose cached searches can include this sitter right
+    # now; empty while the profile is private, since it shows up nowhere
+    if not sitter.is_profile_public:
+        return set(), set()
+    return {sitter.user.city or ANY}, set(sitter.services)
+
+
+def invalidate_sitter(before, after):
+    # before / after are sitter_buckets() taken around a write, so a sitter
+    # who moves city or drops a service is also removed from the old buckets
+    cities = before[0] | after[0]
+    if cities:
+        search_cache().invalidate(cities, before[1] | after[1])
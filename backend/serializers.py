@@ -0,0 +1,124 @@
+import json
+from operator import attrgetter
+
+from flask.json.provider import DefaultJSONProvider
+from schedule import DAYS, MINUTES_PER_DAY, format_time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Response serialization shared by the routes.
+#
+# A FieldMap names the response fields of one model and how to read each of
+# them. serializer(names) resolves the requested field list to its readers
+# once and keeps the resulting function, so a page of results doesn't look up
+# the same fields again for every row. JSON is encoded by orjson when it is
+# installed and by the stdlib encoder otherwise; orjson is an optional extra
+# (pip install orjson) rather than a requirement, since it only speeds the
+# encoding up and needs a Rust toolchain where no wheel is published.
+
+MAX_SERIALIZERS = 256
+TIME_LABELS = [format_time(minute) for minute in range(MINUTES_PER_DAY + 1)]
+
+
+class FieldMap:
+    def __init__(self, fields):
+        self.fields = fields
+        self._serializers = {}
+
+    def serializer(self, names=None):
+        names = tuple(names or self.fields)
+        serialize = self._serializers.get(names)
+        if serialize is None:
+            getters = [(name, self.fields[name]) for name in names]
+            serialize = lambda obj: {name: get(obj) for name, get in getters}
+            if len(self._serializers) >= MAX_SERIALIZERS:
+                self._serializers.clear()
+            self._serializers[names] = serialize
+        return serialize
+
+    def __call__(self, obj, names=None):
+        return self.serializer(names)(obj)
+
+    def many(self, objs, names=None):
+        serialize = self.serializer(names)
+        return [serialize(obj) for obj in objs]
+
+
+USER_PROFILE = FieldMap({
+    'id': attrgetter('id'),
+    'firstName': attrgetter('first_name'),
+    'lastName': attrgetter('last_name'),
+    'email': attrgetter('email'),
+    'phone': attrgetter('phone'),
+    'address': attrgetter('address'),
+    'city': attrgetter('city'),
+    'zipCode': attrgetter('zip_code'),
+    'userType': attrgetter('user_type'),
+})
+
+FAMILY_PROFILE = FieldMap({
+    'childrenCount': attrgetter('children_count'),
+    'sittingNeeds': attrgetter('sitting_needs'),
+})
+
+SITTER_PROFILE = FieldMap({
+    'experience': attrgetter('experience'),
+    'isVerified': attrgetter('is_verified'),
+    'services': attrgetter('services'),
+    'ageGroups': attrgetter('age_groups'),
+    'certifications': attrgetter('certifications'),
+    'hourlyRate': attrgetter('hourly_rate'),
+    'bio': attrgetter('bio'),
+    'isProfilePublic': attrgetter('is_profile_public'),
+    'verificationRequested': attrgetter('verification_requested'),
+})
+
+
+def serialize_availability(slot):
+    # Same fields as Availability.day / start_time / end_time, worked out from
+    # the two stored minutes at once, with the times looked up rather than
+    # formatted; a sitter page can hold hundreds of slots
+    start = slot.start_minute
+    day, offset = divmod(start, MINUTES_PER_DAY)
+    return {
+        'id': slot.id,
+        'day': DAYS[day],
+        'startTime': TIME_LABELS[offset],
+        'endTime': TIME_LABELS[offset + slot.end_minute - start]
+    }
+
+
+def serialize_availabilities(slots):
+    return [serialize_availability(slot) for slot in slots]
+
+
+def dumps(obj):
+    # Compact JSON as UTF-8 bytes
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JSONProvider(DefaultJSONProvider):
+    # Flask's provider, with orjson doing the encoding for jsonify() when it
+    # is installed. Keys are not sorted. Types orjson doesn't handle the way
+    # Flask does, such as dates (HTTP dates in Flask), go through Flask's own
+    # default().
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
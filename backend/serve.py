@@ -0,0 +1,70 @@
+"""Production server for the API.
+
+    python serve.py                                    # waitress, 8 threads
+    python serve.py --server gunicorn --workers 4 --threads 8
+
+waitress runs everywhere and serves from a pool of threads in one process.
+gunicorn (not on Windows) forks --workers processes with --threads threads
+each, so a request stuck on a slow query or a password hash only holds up
+one thread of one worker. Each process sizes its connection pool to its
+thread count unless DB_POOL_SIZE is set. app.py's own app.run(debug=True)
+is for development only.
+"""
+import argparse
+import os
+
+
+def load_app(threads):
+    # app.py reads its configuration when it is first imported
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+    from app import app
+    from extensions import db
+    from migrations import init_db
+
+    with app.app_context():
+        init_db()
+        # gunicorn forks after this; workers must open their own connections
+        db.engine.dispose()
+    return app
+
+
+def serve_waitress(app, host, port, threads):
+    from waitress import serve
+    serve(app, host=host, port=port, threads=threads)
+
+
+def serve_gunicorn(app, host, port, workers, threads, timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', timeout)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=('waitress', 'gunicorn'), default=os.environ.get('SERVER', 'waitress'))
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                        help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 8)),
+                        help='threads per process')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('WEB_TIMEOUT', 30)),
+                        help='seconds before gunicorn restarts a stuck worker')
+    args = parser.parse_args()
+
+    app = load_app(args.threads)
+    if args.server == 'gunicorn':
+        serve_gunicorn(app, args.host, args.port, args.workers, args.threads, args.timeout)
+    else:
+        serve_waitress(app, args.host, args.port, args.threads)
@@ -0,0 +1,77 @@
+import os
+import sys
+from itertools import count
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The seeding helpers are shared with the benchmarks
+for path in (BACKEND_DIR, os.path.join(BACKEND_DIR, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# A cheap hash keeps the registrations fast; set before app.py is imported
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1')
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+
+@pytest.fixture(scope='session')
+def app():
+    # app.py configures itself at import time, so there is one app (and one
+    # temporary database) for the whole session. The seeded sitters take
+    # the first ids, so they go in before any test registers users.
+    from common import create_app, seed_sitters
+
+    app = create_app()
+    with app.app_context():
+        # No ANALYZE on purpose: without statistics the planner assumes every
+        # table is large, which is the case the query plans have to hold up in
+        seed_sitters(500)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+_users = count(1)
+_cities = count(1)
+
+
+@pytest.fixture
+def city():
+    # A city no other test uses, so searches only see this test's sitters
+    return f'Testcity{next(_cities)}'
+
+
+@pytest.fixture
+def register(client):
+    # register(accountType='sitter', ...) -> Authorization headers for a new
+    # user; every call gets its own email
+    def register(**fields):
+        n = next(_users)
+        data = {
+            'firstName': 'Test', 'lastName': f'User{n}', 'email': f'user{n}@test.local',
+            'password': 'pw', 'accountType': 'family', 'city': 'Lahore', **fields
+        }
+        response = client.post('/api/register', json=data)
+        assert response.status_code == 201, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['token']}"}
+    return register
+
+
+@pytest.fixture
+def publish_sitter(client, register):
+    # publish_sitter(city, [(day, start, end), ...]) -> the user id of a new
+    # public sitter (userId in search results)
+    def publish_sitter(city, slots=(('Monday', '09:00', '17:00'),), **fields):
+        headers = register(accountType='sitter', city=city, services=['babysitting'], experience='3-5',
+                           hourlyRate=15, bio='Experienced babysitter', **fields)
+        for day, start_time, end_time in slots:
+            response = client.post('/api/sitter/availability', headers=headers,
+                                   json={'day': day, 'startTime': start_time, 'endTime': end_time})
+            assert response.status_code == 201, response.get_json()
+        assert client.post('/api/sitter/publish-profile', headers=headers).status_code == 200
+        return client.get('/api/profile', headers=headers).get_json()['id']
+    return publish_sitter
@@ -0,0 +1,57 @@
+import pytest
+
+
+@pytest.mark.parametrize('slot', [
+    {'day': 'Monday', 'startTime': 900, 'endTime': '10:00'},
+    {'day': 1, 'startTime': '09:00', 'endTime': '10:00'},
+    {'day': 'Monday', 'endTime': '10:00'},
+    {'day': 'Monday', 'startTime': '10:00', 'endTime': '10:00'},
+    ['Monday', '09:00', '10:00'],
+])
+def test_add_rejects_malformed_slot(client, register, slot):
+    sitter = register(accountType='sitter')
+    response = client.post('/api/sitter/availability', headers=sitter, json=slot)
+    assert response.status_code == 400
+    assert client.get('/api/profile', headers=sitter).get_json()['availability'] == []
+
+
+def test_add_overnight_slot(client, register):
+    sitter = register(accountType='sitter')
+    response = client.post('/api/sitter/availability', headers=sitter,
+                           json={'day': 'Sunday', 'startTime': '22:00', 'endTime': '02:00'})
+    assert response.status_code == 201
+    assert [(s['day'], s['startTime'], s['endTime']) for s in response.get_json()['slots']] == [
+        ('Sunday', '22:00', '24:00'), ('Monday', '00:00', '02:00')
+    ]
+
+
+@pytest.mark.parametrize('slot', [
+    {'day': 'Monday', 'startTime': 900, 'endTime': '10:00'},
+    {'day': 'Monday', 'startTime': '09:00', 'endTime': None},
+    {'day': None, 'startTime': '09:00', 'endTime': '10:00'},
+    {'day': 'Monday', 'startTime': '09:00'},
+    'Monday 09:00-10:00',
+])
+def test_replace_rejects_malformed_slot_and_keeps_schedule(client, register, slot):
+    sitter = register(accountType='sitter')
+    client.post('/api/sitter/availability', headers=sitter,
+                json={'day': 'Monday', 'startTime': '09:00', 'endTime': '12:00'})
+    response = client.put('/api/sitter/availability', headers=sitter, json={'availability': [
+        {'day': 'Tuesday', 'startTime': '09:00', 'endTime': '12:00'}, slot
+    ]})
+    assert response.status_code == 400
+    schedule = client.get('/api/profile', headers=sitter).get_json()['availability']
+    assert [(s['day'], s['startTime'], s['endTime']) for s in schedule] == [('Monday', '09:00', '12:00')]
+
+
+def test_replace_merges_and_splits_overnight_slots(client, register):
+    sitter = register(accountType='sitter')
+    response = client.put('/api/sitter/availability', headers=sitter, json={'availability': [
+        {'day': 'Monday', 'startTime': '09:00', 'endTime': '12:00'},
+        {'day': 'Monday', 'startTime': '11:00', 'endTime': '14:00'},
+        {'day': 'Sunday', 'startTime': '22:00', 'endTime': '02:00'},
+    ]})
+    assert response.status_code == 200
+    assert [(s['day'], s['startTime'], s['endTime']) for s in response.get_json()['availability']] == [
+        ('Monday', '00:00', '02:00'), ('Monday', '09:00', '14:00'), ('Sunday', '22:00', '24:00')
+    ]
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from bulk import RowError, parse_record
+from schedule import slot_intervals
+
+FAMILY = {'email': 'family@import.local', 'firstName': 'Import', 'lastName': 'Family', 'accountType': 'family',
+          'password': 'pw'}
+SITTER = dict(FAMILY, email='sitter@import.local', accountType='sitter')
+
+
+def test_overlapping_slots_are_merged():
+    row = parse_record(dict(SITTER, availability='Monday 09:00-12:00;Monday 11:00-14:00;Tuesday 09:00-10:00'))
+    assert row['availability'] == (slot_intervals('Monday', '09:00', '14:00')
+                                   + slot_intervals('Tuesday', '09:00', '10:00'))
+
+
+@pytest.mark.parametrize('fields', [
+    {'email': ['a@b.c']},
+    {'firstName': {'name': 'x'}},
+    {'password': None},
+    {'hourlyRate': [1]},
+    {'hourlyRate': 'cheap'},
+    {'services': 5},
+    {'services': [1, 2]},
+    {'availability': [{'day': 'Monday', 'startTime': 900, 'endTime': '10:00'}]},
+    {'availability': [{'day': 1, 'startTime': '09:00', 'endTime': '10:00'}]},
+    {'availability': [['Monday', '09:00', '10:00']]},
+    {'availability': 'Monday'},
+])
+def test_malformed_fields_fail_the_row(fields):
+    with pytest.raises(RowError):
+        parse_record(dict(SITTER, **fields))
+
+
+def test_numbers_are_kept_as_text():
+    row = parse_record(dict(FAMILY, zipCode=54000, childrenCount=2))
+    assert row['user']['zip_code'] == '54000'
+    assert row['family']['children_count'] == '2'
+
+
+def test_malformed_row_does_not_abort_the_import(app, tmp_path):
+    from models import User
+
+    path = tmp_path / 'users.ndjson'
+    path.write_text('\n'.join(json.dumps(record) for record in [
+        FAMILY,
+        dict(SITTER, availability=[{'day': 'Monday', 'startTime': 900, 'endTime': '10:00'}]),
+        dict(SITTER, email='rate@import.local', hourlyRate=[1]),
+        dict(SITTER, email={'not': 'an email'}),
+    ]) + '\n')
+    result = app.test_cli_runner().invoke(args=['import-users', str(path), '--workers', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 1 users, 3 failed' in result.output
+    with app.app_context():
+        assert User.query.filter_by(email=FAMILY['email']).count() == 1
+        assert User.query.filter(User.email.like('%@import.local')).count() == 1
@@ -0,0 +1,114 @@
+"""Fail when any query issued by the API falls back to a full table scan.
+
+Drives every route through the Flask test client against the seeded SQLite
+database, records each statement it sends, and runs EXPLAIN QUERY PLAN on
+it. Any plan that contains a SCAN of a table instead of a SEARCH through an
+index fails the test, and so does any call that isn't answered with a 2xx,
+since an error response skips the queries it was meant to exercise.
+
+    python -m pytest tests/test_query_plans.py
+"""
+import re
+
+from sqlalchemy import event
+
+# "SCAN sitter" (or "SCAN TABLE sitter" before SQLite 3.36) is a full table
+# scan; a SCAN that walks an index is fine, and so is a virtual table scan
+# with a constraint such as an FTS5 MATCH ("VIRTUAL TABLE INDEX 0:M...").
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)\b(?! USING (COVERING )?INDEX| VIRTUAL TABLE INDEX \d+:\S)')
+
+SEARCHES = (
+    '', 'city=Lahore', 'service=petsitting', 'ageGroup=toddler', 'verified=true',
+    'day=Monday', 'city=Lahore&service=babysitting&verified=true&day=Monday',
+    'from=Tue 18:00&to=Tue 22:00', 'from=Mon 10:00&to=Mon 12:00&match=cover',
+    'from=Sun 22:00&to=Mon 02:00', 'from=Fri 22:00&to=Sat 02:00&match=cover',
+    'from=Sun 22:00&to=Mon 02:00&match=cover',
+    'fields=id,firstName', 'limit=5', 'near=54000&radius_km=10&limit=5',
+    'near=31.52,74.35&service=babysitting', 'q=experienced babysitting&limit=5',
+    'q=first aid&city=Lahore', 'q=infant&near=54000', 'sort=score&limit=5',
+    'sort=score&verified=true&limit=5', 'sort=rate&city=Lahore&limit=5', 'q=babysitting&sort=score'
+)
+
+
+def ok(response):
+    assert 200 <= response.status_code < 300, (
+        f'{response.request.method} {response.request.full_path} -> {response.status_code}: '
+        f'{response.get_data(as_text=True)[:200]}')
+    return response
+
+
+def drive(client):
+    def auth(token):
+        return {'Authorization': f'Bearer {token}'}
+
+    sitter = ok(client.post('/api/register', json={
+        'firstName': 'Plan', 'lastName': 'Sitter', 'email': 'plan-sitter@bench.local',
+        'password': 'pw', 'accountType': 'sitter', 'city': 'Lahore',
+        'services': ['babysitting'], 'experience': '3-5', 'hourlyRate': 15, 'bio': 'bio'
+    })).get_json()['token']
+    family = ok(client.post('/api/register', json={
+        'firstName': 'Plan', 'lastName': 'Family', 'email': 'plan-family@bench.local',
+        'password': 'pw', 'accountType': 'family', 'city': 'Lahore'
+    })).get_json()['token']
+
+    ok(client.post('/api/login', json={'email': 'plan-sitter@bench.local', 'password': 'pw'}))
+    ok(client.get('/api/profile', headers=auth(sitter)))
+    ok(client.get('/api/profile', headers=auth(family)))
+    ok(client.put('/api/profile', headers=auth(sitter),
+                  json={'bio': 'updated', 'services': ['babysitting', 'petsitting']}))
+    ok(client.put('/api/profile', headers=auth(family), json={'sittingNeeds': 'weekends'}))
+    slot = ok(client.post('/api/sitter/availability', headers=auth(sitter),
+                          json={'day': 'Tuesday', 'startTime': '18:00', 'endTime': '22:00'})).get_json()
+    ok(client.post('/api/sitter/availability', headers=auth(sitter),
+                   json={'day': 'Monday', 'startTime': '09:00', 'endTime': '12:00'}))
+    ok(client.post('/api/sitter/availability', headers=auth(sitter),
+                   json={'day': 'Monday', 'startTime': '11:00', 'endTime': '14:00'}))
+    ok(client.post('/api/sitter/publish-profile', headers=auth(sitter)))
+    ok(client.post('/api/sitter/request-verification', headers=auth(sitter)))
+    ok(client.delete(f"/api/sitter/availability/{slot['availability']['id']}", headers=auth(sitter)))
+    ok(client.put('/api/sitter/availability', headers=auth(sitter), json={'availability': [
+        {'day': 'Monday', 'startTime': '09:00', 'endTime': '14:00'},
+        {'day': 'Saturday', 'startTime': '10:00', 'endTime': '16:00'}
+    ]}))
+
+    for query in SEARCHES:
+        response = ok(client.get(f'/api/sitters?{query}', headers=auth(family)))
+        if response.headers.get('X-Next-Cursor'):
+            ok(client.get(f"/api/sitters?{query}&cursor={response.headers['X-Next-Cursor']}", headers=auth(family)))
+
+
+def test_no_full_table_scans(app):
+    from extensions import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        statements.append((statement, parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            drive(app.test_client())
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        failures = []
+        seen = set()
+        connection = db.engine.raw_connection()
+        try:
+            for statement, parameters in statements:
+                if statement in seen or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                seen.add(statement)
+                plan = [row[3] for row in connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+                if any(FULL_SCAN.match(line) for line in plan):
+                    failures.append((statement, plan))
+        finally:
+            connection.close()
+
+    assert seen
+    assert not failures, '\n\n'.join(
+        'FULL TABLE SCAN:\n' + statement.strip() + '\n' + '\n'.join(f'  {line}' for line in plan)
+        for statement, plan in failures)
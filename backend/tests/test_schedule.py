@@ -0,0 +1,68 @@
+import pytest
+
+from schedule import (MINUTES_PER_DAY, MINUTES_PER_WEEK, InvalidSchedule, merge_slots, parse_day, parse_time,
+                      parse_week_time, slot_intervals)
+
+FRIDAY = 4 * MINUTES_PER_DAY
+SUNDAY = 6 * MINUTES_PER_DAY
+
+
+def test_parse_day_accepts_names_and_abbreviations():
+    assert parse_day('Monday') == 0
+    assert parse_day(' sun ') == 6
+
+
+@pytest.mark.parametrize('value', [None, '', 'Funday', 1, ['Monday']])
+def test_parse_day_rejects(value):
+    with pytest.raises(InvalidSchedule):
+        parse_day(value)
+
+
+def test_parse_time():
+    assert parse_time('09:30') == 570
+    assert parse_time('24:00') == MINUTES_PER_DAY
+
+
+@pytest.mark.parametrize('value', [None, '', '9', '09:60', '24:01', 900, 9.5])
+def test_parse_time_rejects(value):
+    with pytest.raises(InvalidSchedule):
+        parse_time(value)
+
+
+def test_slot_within_a_day():
+    assert slot_intervals('Friday', '09:00', '17:00') == [(FRIDAY + 540, FRIDAY + 1020)]
+
+
+def test_overnight_slot_is_split_at_midnight():
+    assert slot_intervals('Friday', '22:00', '02:00') == [
+        (FRIDAY + 1320, FRIDAY + MINUTES_PER_DAY),
+        (FRIDAY + MINUTES_PER_DAY, FRIDAY + MINUTES_PER_DAY + 120),
+    ]
+
+
+def test_sunday_night_carries_over_to_monday():
+    assert slot_intervals('Sunday', '22:00', '02:00') == [(SUNDAY + 1320, MINUTES_PER_WEEK), (0, 120)]
+
+
+def test_slot_ending_at_midnight_is_not_split():
+    assert slot_intervals('Friday', '22:00', '00:00') == [(FRIDAY + 1320, FRIDAY + MINUTES_PER_DAY)]
+
+
+@pytest.mark.parametrize('start_time, end_time', [('10:00', '10:00'), ('24:00', '02:00')])
+def test_slot_intervals_rejects(start_time, end_time):
+    with pytest.raises(InvalidSchedule):
+        slot_intervals('Monday', start_time, end_time)
+
+
+def test_merge_folds_overlapping_and_touching_slots():
+    assert merge_slots([(660, 840), (540, 720), (840, 900), (1000, 1100)]) == [(540, 900), (1000, 1100)]
+
+
+def test_merge_keeps_days_apart():
+    # Friday 22:00-24:00 and Saturday 00:00-02:00 touch but stay two rows
+    slots = slot_intervals('Friday', '22:00', '02:00')
+    assert merge_slots(slots) == slots
+
+
+def test_parse_week_time():
+    assert parse_week_time('Tue 18:00') == MINUTES_PER_DAY + 1080
@@ -0,0 +1,74 @@
+import base64
+import json
+
+import pytest
+
+from common import QueryCounter
+from search import default_fields
+
+
+def cursor(position):
+    raw = json.dumps(position).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def test_empty_field_list_uses_the_default_projection(app, client, register, publish_sitter, city):
+    from extensions import db
+
+    for _ in range(3):
+        publish_sitter(city)
+    family = register()
+
+    with app.app_context():
+        with QueryCounter(db.engine) as default:
+            expected = client.get(f'/api/sitters?city={city}&limit=49', headers=family)
+        with QueryCounter(db.engine) as empty:
+            response = client.get(f'/api/sitters?city={city}&fields=,', headers=family)
+
+    assert response.status_code == 200
+    assert [set(sitter) for sitter in response.get_json()] == [set(default_fields())] * 3
+    assert response.get_json() == expected.get_json()
+    # Loaded up front like any other search, not lazily per sitter
+    assert empty.count == default.count
+
+
+@pytest.mark.parametrize('query, position', [
+    ('', {'id': 10 ** 24}),
+    ('', {'id': True}),
+    ('', {'id': 1.5}),
+    ('sort=rate', {'value': float('inf'), 'id': 1}),
+    ('sort=score', {'value': 10 ** 24, 'id': 1}),
+    ('q=babysitter', {'rank': float('nan'), 'id': 1}),
+    ('near=54000', {'distance': float('-inf'), 'id': 1}),
+])
+def test_out_of_range_cursor_is_rejected(client, register, query, position):
+    response = client.get(f'/api/sitters?{query}&cursor={cursor(position)}', headers=register())
+    assert response.status_code == 400
+    assert response.get_json() == {'message': 'Invalid cursor'}
+
+
+@pytest.mark.parametrize('window', [
+    'from=Fri 22:00&to=Sat 02:00',
+    'from=Fri 23:00&to=Sat 01:00',
+    'from=Sun 22:00&to=Mon 02:00',
+])
+@pytest.mark.parametrize('match', ['overlap', 'cover'])
+def test_overnight_window_matches_overnight_slots(client, register, publish_sitter, city, window, match):
+    overnight = publish_sitter(city, [('Friday', '22:00', '02:00'), ('Sunday', '22:00', '02:00')])
+    publish_sitter(city, [('Friday', '09:00', '17:00')])
+    response = client.get(f'/api/sitters?city={city}&{window}&match={match}', headers=register())
+    assert response.status_code == 200
+    assert [sitter['userId'] for sitter in response.get_json()] == [overnight]
+
+
+def test_cover_window_needs_every_day_covered(client, register, publish_sitter, city):
+    # Available either side of midnight, but not through it
+    publish_sitter(city, [('Friday', '20:00', '23:00'), ('Saturday', '00:00', '03:00')])
+    evening = publish_sitter(city, [('Friday', '20:00', '00:00')])
+    family = register()
+    cover = client.get(f'/api/sitters?city={city}&from=Fri 22:00&to=Sat 01:00&match=cover', headers=family)
+    assert cover.get_json() == []
+    overlap = client.get(f'/api/sitters?city={city}&from=Fri 22:00&to=Sat 01:00', headers=family)
+    assert len(overlap.get_json()) == 2
+    until_midnight = client.get(f'/api/sitters?city={city}&from=Fri 22:00&to=Sat 00:00&match=cover', headers=family)
+    assert [sitter['userId'] for sitter in until_midnight.get_json()] == [evening]
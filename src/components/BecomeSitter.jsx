@@ -1,7 +1,7 @@
 "use client"
 
 import { useState, useEffect, useRef } from "react"
-import { useAuth } from "../context/AuthContext"
+import { authFetch, useAuth } from "../context/AuthContext"
 
 export default function BecomeSitter() {
   const { currentUser, getProfile, updateProfile } = useAuth()
@@ -73,11 +73,10 @@ export default function BecomeSitter() {
         throw new Error("Not authenticated")
       }
 
-      const response = await fetch("http://localhost:5000/api/sitter/availability", {
+      const response = await authFetch("http://localhost:5000/api/sitter/availability", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
         },
         body: JSON.stringify(newAvailability),
       })
@@ -88,8 +87,12 @@ export default function BecomeSitter() {
         throw new Error(data.message || "Failed to add availability")
       }
 
-      setAvailabilities((prev) => [...prev, data.availability])
-      setSuccess("Availability added successfully")
+      // Overlapping slots are merged server-side; drop the ones that were folded in.
+      // An overnight slot comes back as two, split at midnight
+      const added = data.slots || [data.availability]
+      const replaced = [...added.map((a) => a.id), ...(data.replacedIds || [])]
+      setAvailabilities((prev) => [...prev.filter((a) => !replaced.includes(a.id)), ...added])
+      setSuccess(data.message)
 
       // Reset form
       setNewAvailability({
@@ -109,11 +112,8 @@ export default function BecomeSitter() {
         throw new Error("Not authenticated")
       }
 
-      const response = await fetch(`http://localhost:5000/api/sitter/availability/${id}`, {
+      const response = await authFetch(`http://localhost:5000/api/sitter/availability/${id}`, {
         method: "DELETE",
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
       })
 
       if (!response.ok) {
@@ -189,11 +189,8 @@ export default function BecomeSitter() {
         throw new Error("Not authenticated")
       }
 
-      const response = await fetch("http://localhost:5000/api/sitter/publish-profile", {
+      const response = await authFetch("http://localhost:5000/api/sitter/publish-profile", {
         method: "POST",
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
       })
 
       const data = await response.json()
@@ -1,12 +1,15 @@
 "use client"
 
 import { useState, useEffect } from "react"
-import { useAuth } from "../context/AuthContext"
+import { authFetch, useAuth } from "../context/AuthContext"
 
 export default function FindSitter() {
   const { currentUser } = useAuth()
   const [isLoading, setIsLoading] = useState(true)
   const [sitters, setSitters] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [appliedQuery, setAppliedQuery] = useState("")
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
   const [error, setError] = useState("")
   const [filters, setFilters] = useState({
     service: "",
@@ -19,16 +22,32 @@ export default function FindSitter() {
     fetchSitters()
   }, [])
 
+  // Results come a page at a time; X-Next-Cursor is set while there are more
+  const fetchPage = async (query, cursor) => {
+    const token = localStorage.getItem("token")
+    if (!token) {
+      throw new Error("Not authenticated")
+    }
+
+    const queryParams = new URLSearchParams(query)
+    if (cursor) queryParams.set("cursor", cursor)
+
+    const response = await authFetch(`http://localhost:5000/api/sitters?${queryParams.toString()}`)
+
+    const data = await response.json()
+
+    if (!response.ok) {
+      throw new Error(data.message || "Failed to fetch sitters")
+    }
+
+    return { page: data, cursor: response.headers.get("X-Next-Cursor") }
+  }
+
   const fetchSitters = async () => {
     setIsLoading(true)
     setError("")
 
     try {
-      const token = localStorage.getItem("token")
-      if (!token) {
-        throw new Error("Not authenticated")
-      }
-
       // Build query string from filters
       const queryParams = new URLSearchParams()
       if (filters.service) queryParams.append("service", filters.service)
@@ -36,23 +55,31 @@ export default function FindSitter() {
       if (filters.verified) queryParams.append("verified", "true")
       if (filters.day) queryParams.append("day", filters.day)
 
-      const response = await fetch(`http://localhost:5000/api/sitters?${queryParams.toString()}`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      })
-
-      const data = await response.json()
+      // Later pages are fetched with the filters that produced the first one
+      const query = queryParams.toString()
+      const { page, cursor } = await fetchPage(query)
+      setAppliedQuery(query)
+      setSitters(page)
+      setNextCursor(cursor)
+    } catch (err) {
+      setError(err.message)
+    } finally {
+      setIsLoading(false)
+    }
+  }
 
-      if (!response.ok) {
-        throw new Error(data.message || "Failed to fetch sitters")
-      }
+  const loadMoreSitters = async () => {
+    setIsLoadingMore(true)
+    setError("")
 
-      setSitters(data)
+    try {
+      const { page, cursor } = await fetchPage(appliedQuery, nextCursor)
+      setSitters((prev) => [...prev, ...page])
+      setNextCursor(cursor)
     } catch (err) {
       setError(err.message)
     } finally {
-      setIsLoading(false)
+      setIsLoadingMore(false)
     }
   }
 
@@ -216,117 +243,132 @@ export default function FindSitter() {
                   </p>
                 </div>
               ) : (
-                <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
-                  {sitters.map((sitter) => (
-                    <div
-                      key={sitter.id}
-                      className="bg-white rounded-lg shadow-md overflow-hidden transition-all duration-300 hover:shadow-lg transform hover:-translate-y-1"
-                    >
-                      <div className="p-4">
-                        <div className="flex items-start justify-between">
-                          <div className="flex items-center">
-                            <div className="w-12 h-12 rounded-full bg-teal-100 flex items-center justify-center text-teal-600 text-lg font-bold">
-                              {sitter.firstName.charAt(0)}
-                              {sitter.lastName.charAt(0)}
-                            </div>
-                            <div className="ml-3">
-                              <h3 className="text-lg font-medium text-gray-900">
-                                {sitter.firstName} {sitter.lastName}
-                              </h3>
-                              <p className="text-sm text-gray-600">{sitter.city || "Location not specified"}</p>
+                <>
+                  <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
+                    {sitters.map((sitter) => (
+                      <div
+                        key={sitter.id}
+                        className="bg-white rounded-lg shadow-md overflow-hidden transition-all duration-300 hover:shadow-lg transform hover:-translate-y-1"
+                      >
+                        <div className="p-4">
+                          <div className="flex items-start justify-between">
+                            <div className="flex items-center">
+                              <div className="w-12 h-12 rounded-full bg-teal-100 flex items-center justify-center text-teal-600 text-lg font-bold">
+                                {sitter.firstName.charAt(0)}
+                                {sitter.lastName.charAt(0)}
+                              </div>
+                              <div className="ml-3">
+                                <h3 className="text-lg font-medium text-gray-900">
+                                  {sitter.firstName} {sitter.lastName}
+                                </h3>
+                                <p className="text-sm text-gray-600">{sitter.city || "Location not specified"}</p>
+                              </div>
                             </div>
+                            {sitter.isVerified && (
+                              <span className="bg-green-100 text-green-800 text-xs px-2 py-1 rounded-full">Verified</span>
+                            )}
                           </div>
-                          {sitter.isVerified && (
-                            <span className="bg-green-100 text-green-800 text-xs px-2 py-1 rounded-full">Verified</span>
-                          )}
-                        </div>
 
-                        <div className="mt-4">
-                          <div className="flex items-center mb-2">
-                            <svg
-                              xmlns="http://www.w3.org/2000/svg"
-                              className="h-5 w-5 text-teal-600"
-                              fill="none"
-                              viewBox="0 0 24 24"
-                              stroke="currentColor"
-                            >
-                              <path
-                                strokeLinecap="round"
-                                strokeLinejoin="round"
-                                strokeWidth={2}
-                                d="M12 8c-1.657 0-3 .895-3 2s1.343 2 3 2 3 .895 3 2-1.343 2-3 2m0-8c1.11 0 2.08.402 2.599 1M12 8V7m0 1v8m0 0v1m0-1c-1.11 0-2.08-.402-2.599-1M21 12a9 9 0 11-18 0 9 9 0 0118 0z"
-                              />
-                            </svg>
-                            <span className="ml-2 text-gray-700">${sitter.hourlyRate}/hour</span>
-                          </div>
+                          <div className="mt-4">
+                            <div className="flex items-center mb-2">
+                              <svg
+                                xmlns="http://www.w3.org/2000/svg"
+                                className="h-5 w-5 text-teal-600"
+                                fill="none"
+                                viewBox="0 0 24 24"
+                                stroke="currentColor"
+                              >
+                                <path
+                                  strokeLinecap="round"
+                                  strokeLinejoin="round"
+                                  strokeWidth={2}
+                                  d="M12 8c-1.657 0-3 .895-3 2s1.343 2 3 2 3 .895 3 2-1.343 2-3 2m0-8c1.11 0 2.08.402 2.599 1M12 8V7m0 1v8m0 0v1m0-1c-1.11 0-2.08-.402-2.599-1M21 12a9 9 0 11-18 0 9 9 0 0118 0z"
+                                />
+                              </svg>
+                              <span className="ml-2 text-gray-700">${sitter.hourlyRate}/hour</span>
+                            </div>
 
-                          <div className="flex items-center mb-2">
-                            <svg
-                              xmlns="http://www.w3.org/2000/svg"
-                              className="h-5 w-5 text-teal-600"
-                              fill="none"
-                              viewBox="0 0 24 24"
-                              stroke="currentColor"
-                            >
-                              <path
-                                strokeLinecap="round"
-                                strokeLinejoin="round"
-                                strokeWidth={2}
-                                d="M8 7V3m8 4V3m-9 8h10M5 21h14a2 2 0 002-2V7a2 2 0 00-2-2H5a2 2 0 00-2 2v12a2 2 0 002 2z"
-                              />
-                            </svg>
-                            <span className="ml-2 text-gray-700">{sitter.experience} experience</span>
-                          </div>
+                            <div className="flex items-center mb-2">
+                              <svg
+                                xmlns="http://www.w3.org/2000/svg"
+                                className="h-5 w-5 text-teal-600"
+                                fill="none"
+                                viewBox="0 0 24 24"
+                                stroke="currentColor"
+                              >
+                                <path
+                                  strokeLinecap="round"
+                                  strokeLinejoin="round"
+                                  strokeWidth={2}
+                                  d="M8 7V3m8 4V3m-9 8h10M5 21h14a2 2 0 002-2V7a2 2 0 00-2-2H5a2 2 0 00-2 2v12a2 2 0 002 2z"
+                                />
+                              </svg>
+                              <span className="ml-2 text-gray-700">{sitter.experience} experience</span>
+                            </div>
 
-                          <div className="flex items-center">
-                            <svg
-                              xmlns="http://www.w3.org/2000/svg"
-                              className="h-5 w-5 text-teal-600"
-                              fill="none"
-                              viewBox="0 0 24 24"
-                              stroke="currentColor"
-                            >
-                              <path
-                                strokeLinecap="round"
-                                strokeLinejoin="round"
-                                strokeWidth={2}
-                                d="M9 5H7a2 2 0 00-2 2v12a2 2 0 002 2h10a2 2 0 002-2V7a2 2 0 00-2-2h-2M9 5a2 2 0 002 2h2a2 2 0 002-2M9 5a2 2 0 012-2h2a2 2 0 012 2"
-                              />
-                            </svg>
-                            <span className="ml-2 text-gray-700">{sitter.services.join(", ")}</span>
+                            <div className="flex items-center">
+                              <svg
+                                xmlns="http://www.w3.org/2000/svg"
+                                className="h-5 w-5 text-teal-600"
+                                fill="none"
+                                viewBox="0 0 24 24"
+                                stroke="currentColor"
+                              >
+                                <path
+                                  strokeLinecap="round"
+                                  strokeLinejoin="round"
+                                  strokeWidth={2}
+                                  d="M9 5H7a2 2 0 00-2 2v12a2 2 0 002 2h10a2 2 0 002-2V7a2 2 0 00-2-2h-2M9 5a2 2 0 002 2h2a2 2 0 002-2M9 5a2 2 0 012-2h2a2 2 0 012 2"
+                                />
+                              </svg>
+                              <span className="ml-2 text-gray-700">{sitter.services.join(", ")}</span>
+                            </div>
                           </div>
-                        </div>
 
-                        {sitter.bio && (
-                          <div className="mt-3">
-                            <p className="text-sm text-gray-600 line-clamp-2">{sitter.bio}</p>
-                          </div>
-                        )}
-
-                        <div className="mt-4">
-                          <h4 className="text-sm font-medium text-gray-700 mb-1">Availability</h4>
-                          <div className="flex flex-wrap gap-1">
-                            {sitter.availability.length > 0 ? (
-                              sitter.availability.map((a, index) => (
-                                <span key={index} className="bg-gray-100 text-gray-800 text-xs px-2 py-1 rounded">
-                                  {a.day} ({a.startTime}-{a.endTime})
-                                </span>
-                              ))
-                            ) : (
-                              <span className="text-sm text-gray-500 italic">No availability specified</span>
-                            )}
+                          {sitter.bio && (
+                            <div className="mt-3">
+                              <p className="text-sm text-gray-600 line-clamp-2">{sitter.bio}</p>
+                            </div>
+                          )}
+
+                          <div className="mt-4">
+                            <h4 className="text-sm font-medium text-gray-700 mb-1">Availability</h4>
+                            <div className="flex flex-wrap gap-1">
+                              {sitter.availability.length > 0 ? (
+                                sitter.availability.map((a, index) => (
+                                  <span key={index} className="bg-gray-100 text-gray-800 text-xs px-2 py-1 rounded">
+                                    {a.day} ({a.startTime}-{a.endTime})
+                                  </span>
+                                ))
+                              ) : (
+                                <span className="text-sm text-gray-500 italic">No availability specified</span>
+                              )}
+                            </div>
                           </div>
-                        </div>
 
-                        <div className="mt-4 pt-4 border-t flex justify-end">
-                          <button className="px-4 py-2 bg-teal-600 text-white rounded-md text-sm font-medium hover:bg-teal-700 transition-all duration-300">
-                            Contact Sitter
-                          </button>
+                          <div className="mt-4 pt-4 border-t flex justify-end">
+                            <button className="px-4 py-2 bg-teal-600 text-white rounded-md text-sm font-medium hover:bg-teal-700 transition-all duration-300">
+                              Contact Sitter
+                            </button>
+                          </div>
                         </div>
                       </div>
+                    ))}
+                  </div>
+
+                  {nextCursor && (
+                    <div className="mt-6 flex justify-center">
+                      <button
+                        type="button"
+                        onClick={loadMoreSitters}
+                        disabled={isLoadingMore}
+                        className="px-4 py-2 bg-white border border-teal-600 text-teal-600 rounded-md text-sm font-medium hover:bg-teal-50 disabled:opacity-50 transition-all duration-300"
+                      >
+                        {isLoadingMore ? "Loading..." : "Load more sitters"}
+                      </button>
                     </div>
-                  ))}
-                </div>
+                  )}
+                </>
               )}
             </div>
           </div>
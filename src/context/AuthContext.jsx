@@ -4,6 +4,52 @@ import { createContext, useState, useEffect, useContext } from "react"
 
 const AuthContext = createContext(null)
 
+// Access tokens are short-lived. On a 401 the stored refresh token is traded
+// for a new pair once and the request is retried with the new access token.
+const refreshTokens = async () => {
+  const refreshToken = localStorage.getItem("refreshToken")
+  if (!refreshToken) {
+    return false
+  }
+
+  try {
+    const response = await fetch("http://localhost:5000/api/token/refresh", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ refreshToken }),
+    })
+    if (!response.ok) {
+      return false
+    }
+
+    const data = await response.json()
+    localStorage.setItem("token", data.token)
+    localStorage.setItem("refreshToken", data.refreshToken)
+    return true
+  } catch (e) {
+    return false
+  }
+}
+
+export const authFetch = async (url, options = {}) => {
+  const send = () =>
+    fetch(url, {
+      ...options,
+      headers: {
+        ...options.headers,
+        Authorization: `Bearer ${localStorage.getItem("token")}`,
+      },
+    })
+
+  let response = await send()
+  if (response.status === 401 && (await refreshTokens())) {
+    response = await send()
+  }
+  return response
+}
+
 export const AuthProvider = ({ children }) => {
   const [currentUser, setCurrentUser] = useState(null)
   const [loading, setLoading] = useState(true)
@@ -17,11 +63,7 @@ export const AuthProvider = ({ children }) => {
       if (token && userData) {
         try {
           // Verify token by making a profile request
-          const response = await fetch("http://localhost:5000/api/profile", {
-            headers: {
-              Authorization: `Bearer ${token}`,
-            },
-          })
+          const response = await authFetch("http://localhost:5000/api/profile")
 
           if (response.ok) {
             const profileData = await response.json()
@@ -29,12 +71,14 @@ export const AuthProvider = ({ children }) => {
           } else {
             // If token is invalid or expired, clear storage
             localStorage.removeItem("token")
+            localStorage.removeItem("refreshToken")
             localStorage.removeItem("user")
             setCurrentUser(null)
           }
         } catch (e) {
           console.error("Error verifying token", e)
           localStorage.removeItem("token")
+          localStorage.removeItem("refreshToken")
           localStorage.removeItem("user")
           setCurrentUser(null)
         }
@@ -65,6 +109,7 @@ export const AuthProvider = ({ children }) => {
       }
 
       localStorage.setItem("token", data.token)
+      localStorage.setItem("refreshToken", data.refreshToken)
       localStorage.setItem("user", JSON.stringify(data.user))
       setCurrentUser(data.user)
       return data
@@ -96,6 +141,7 @@ export const AuthProvider = ({ children }) => {
       }
 
       localStorage.setItem("token", data.token)
+      localStorage.setItem("refreshToken", data.refreshToken)
       localStorage.setItem("user", JSON.stringify(data.user))
       setCurrentUser(data.user)
       return data
@@ -108,7 +154,12 @@ export const AuthProvider = ({ children }) => {
   }
 
   const logout = () => {
+    // Revokes the tokens server-side too, so a copied token stops working
+    if (localStorage.getItem("token")) {
+      authFetch("http://localhost:5000/api/logout", { method: "POST" }).catch(() => {})
+    }
     localStorage.removeItem("token")
+    localStorage.removeItem("refreshToken")
     localStorage.removeItem("user")
     setCurrentUser(null)
   }
@@ -123,11 +174,10 @@ export const AuthProvider = ({ children }) => {
         throw new Error("Not authenticated")
       }
 
-      const response = await fetch("http://localhost:5000/api/profile", {
+      const response = await authFetch("http://localhost:5000/api/profile", {
         method: "PUT",
         headers: {
           "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
         },
         body: JSON.stringify(profileData),
       })
@@ -159,11 +209,8 @@ export const AuthProvider = ({ children }) => {
         throw new Error("Not authenticated")
       }
 
-      const response = await fetch("http://localhost:5000/api/profile", {
+      const response = await authFetch("http://localhost:5000/api/profile", {
         method: "GET",
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
       })
 
       const data = await response.json()
@@ -181,6 +228,7 @@ export const AuthProvider = ({ children }) => {
       if (err.message === "Token has expired") {
         // Clear storage and state if token expired
         localStorage.removeItem("token")
+        localStorage.removeItem("refreshToken")
         localStorage.removeItem("user")
         setCurrentUser(null)
       }
@@ -199,11 +247,8 @@ export const AuthProvider = ({ children }) => {
         throw new Error("Not authenticated")
       }
 
-      const response = await fetch("http://localhost:5000/api/sitter/request-verification", {
+      const response = await authFetch("http://localhost:5000/api/sitter/request-verification", {
         method: "POST",
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
       })
 
       const data = await response.json()